@@ -1,15 +1,28 @@
-from flask import Flask, request, abort
-import json
+import os
+from flask import Flask, request, jsonify
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
+from jwks import JWKSCache
+from token_cache import VerifiedTokenCache
 
 
 app = Flask(__name__)
 
-AUTH0_DOMAIN = @TODO_REPLACE_WITH_YOUR_DOMAIN
+# @TODO replace the defaults with your domain and API audience, or set them
+# in the environment
+AUTH0_DOMAIN = os.environ.get('AUTH0_DOMAIN', 'TODO_REPLACE_WITH_YOUR_DOMAIN')
 ALGORITHMS = ['RS256']
-API_AUDIENCE = @TODO_REPLACE_WITH_YOUR_API_AUDIENCE
+API_AUDIENCE = os.environ.get('API_AUDIENCE', 'TODO_REPLACE_WITH_YOUR_API_AUDIENCE')
+# Point JWKS_URL at jwks_stub.py to work offline
+JWKS_URL = os.environ.get(
+    'JWKS_URL', f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+
+# Shared by every request in the process; see jwks.py
+jwks = JWKSCache(JWKS_URL)
+# Payloads of tokens whose signature was already checked; see token_cache.py.
+# TOKEN_CACHE_SIZE=0 turns it off.
+verified_tokens = VerifiedTokenCache(
+    int(os.environ.get('TOKEN_CACHE_SIZE', 1024)))
 
 
 class AuthError(Exception):
@@ -51,9 +64,37 @@ def get_token_auth_header():
     return token
 
 
+def check_claims(payload):
+    """Re-checks the audience and issuer of an already verified payload
+    """
+    audience = payload.get('aud')
+    if not isinstance(audience, list):
+        audience = [audience]
+    if API_AUDIENCE not in audience or \
+            payload.get('iss') != 'https://' + AUTH0_DOMAIN + '/':
+        raise AuthError({
+            'code': 'invalid_claims',
+            'description': 'Incorrect claims. Please, check the audience and issuer.'
+        }, 401)
+
+
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
+    return dict(verify_token(token)[0])
+
+
+def verify_token(token):
+    """Verified payload of the token (shared, not to be modified) and its
+    permissions as a frozenset
+    """
+    cached = verified_tokens.get(token)
+    if cached is not None:
+        payload, kid, permissions = cached
+        # once the key set no longer has its key, the token is not trusted
+        if jwks.get(kid) is not None:
+            check_claims(payload)
+            return payload, permissions
+        verified_tokens.delete(token)
+
     unverified_header = jwt.get_unverified_header(token)
     rsa_key = {}
     if 'kid' not in unverified_header:
@@ -62,15 +103,15 @@ def verify_decode_jwt(token):
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    key = jwks.get(unverified_header['kid'])
+    if key:
+        rsa_key = {
+            'kty': key['kty'],
+            'kid': key['kid'],
+            'use': key['use'],
+            'n': key['n'],
+            'e': key['e']
+        }
     if rsa_key:
         try:
             payload = jwt.decode(
@@ -80,8 +121,14 @@ def verify_decode_jwt(token):
                 audience=API_AUDIENCE,
                 issuer='https://' + AUTH0_DOMAIN + '/'
             )
+            permissions = payload.get('permissions')
+            if isinstance(permissions, list):
+                permissions = frozenset(permissions)
+            else:
+                permissions = None
+            verified_tokens.set(token, payload, key['kid'], permissions)
 
-            return payload
+            return payload, permissions
 
         except jwt.ExpiredSignatureError:
             raise AuthError({
@@ -94,6 +141,12 @@ def verify_decode_jwt(token):
                 'code': 'invalid_claims',
                 'description': 'Incorrect claims. Please, check the audience and issuer.'
             }, 401)
+        except jwt.JWTError:
+            # bad signature, or a token that does not decode
+            raise AuthError({
+                'code': 'invalid_header',
+                'description': 'Unable to parse authentication token.'
+            }, 401)
         except Exception:
             raise AuthError({
                 'code': 'invalid_header',
@@ -105,20 +158,71 @@ def verify_decode_jwt(token):
             }, 400)
 
 
-def requires_auth(f):
-    @wraps(f)
-    def wrapper(*args, **kwargs):
-        token = get_token_auth_header()
-        try:
-            payload = verify_decode_jwt(token)
-        except:
-            abort(401)
-        return f(payload, *args, **kwargs)
+def check_permissions(required, permissions):
+    if permissions is None:
+        raise AuthError({
+            'code': 'invalid_claims',
+            'description': 'Permissions not included in JWT.'
+        }, 400)
+    if not required <= permissions:
+        raise AuthError({
+            'code': 'unauthorized',
+            'description': 'Permission not found.'
+        }, 403)
 
-    return wrapper
+
+def requires_auth(permission=None):
+    """Requires a valid token and, if given, the permission (or all of an
+    iterable of permissions) in its permissions claim
+
+    Use as @requires_auth('get:images') or, to only authenticate,
+    @requires_auth() or @requires_auth. The route gets the payload.
+    """
+    if callable(permission):
+        return requires_auth()(permission)
+    if permission is None:
+        required = frozenset()
+    elif isinstance(permission, str):
+        required = frozenset([permission])
+    else:
+        required = frozenset(permission)
+
+    def requires_auth_decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            token = get_token_auth_header()
+            try:
+                payload, permissions = verify_token(token)
+            except jwt.JWTError:
+                raise AuthError({
+                    'code': 'invalid_header',
+                    'description': 'Unable to parse authentication token.'
+                }, 401)
+            if required:
+                check_permissions(required, permissions)
+            return f(dict(payload), *args, **kwargs)
+
+        return wrapper
+    return requires_auth_decorator
+
+
+@app.errorhandler(AuthError)
+def auth_error(error):
+    return jsonify({
+        'success': False,
+        'error': error.status_code,
+        'code': error.error['code'],
+        'message': error.error['description']
+    }), error.status_code
 
 @app.route('/headers')
 @requires_auth
 def headers(payload):
     print(payload)
+    return 'Access Granted'
+
+
+@app.route('/images')
+@requires_auth('get:images')
+def images(payload):
     return 'Access Granted'
\ No newline at end of file
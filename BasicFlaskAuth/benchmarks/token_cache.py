@@ -0,0 +1,57 @@
+"""Cost of verifying a bearer token per request, with and without the
+verified-token cache.
+
+    python benchmarks/token_cache.py [--requests N] [--clients C]
+
+Runs against jwks_stub.py, so no Auth0 tenant or network is needed. Each
+of C clients sends its own token, N requests in total, through
+verify_decode_jwt (signature check, claims, key lookup), the way
+requires_auth does.
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from jwks_stub import StubJWKS  # noqa: E402
+
+
+def run(auth, tokens, requests):
+    started = time.perf_counter()
+    for i in range(requests):
+        auth.verify_decode_jwt(tokens[i % len(tokens)])
+    return (time.perf_counter() - started) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--clients', type=int, default=20)
+    args = parser.parse_args()
+
+    with StubJWKS() as stub:
+        os.environ.update(AUTH0_DOMAIN=stub.domain,
+                          API_AUDIENCE=stub.audience, JWKS_URL=stub.url)
+        import app as auth
+        from token_cache import VerifiedTokenCache
+
+        tokens = [stub.token({'sub': 'client|{}'.format(i)})
+                  for i in range(args.clients)]
+        auth.verified_tokens = VerifiedTokenCache(0)
+        without = run(auth, tokens, args.requests)
+        auth.verified_tokens = VerifiedTokenCache()
+        with_cache = run(auth, tokens, args.requests)
+        stats = auth.verified_tokens.stats()
+
+    print('cache disabled {:>9.1f} us/request'.format(without * 1e6))
+    print('cache enabled  {:>9.1f} us/request  ({:.0f}x)'.format(
+        with_cache * 1e6, without / with_cache))
+    print('hits {hits}, misses {misses}, hit rate {hit_rate:.1%}'.format(
+        **stats))
+
+
+if __name__ == '__main__':
+    main()
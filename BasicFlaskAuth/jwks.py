@@ -0,0 +1,108 @@
+"""Process-wide cache of the Auth0 JSON Web Key Set, keyed by kid.
+
+The key set is fetched once and kept for as long as the response's
+Cache-Control max-age says (default_ttl without one). Shortly before that
+runs out it is refreshed in a background thread, so requests never wait on
+Auth0 while the keys are fresh. A token signed with a kid we don't know
+triggers a refetch (the keys may have been rotated), at most once every
+min_refetch_interval seconds, so made-up kids cannot flood Auth0.
+"""
+import json
+import re
+import threading
+import time
+from urllib.request import urlopen
+
+
+class JWKSCache:
+
+    def __init__(self, url, default_ttl=600, min_refetch_interval=30,
+                 refresh_ahead=0.8, timeout=5):
+        self.url = url
+        self.default_ttl = default_ttl
+        self.min_refetch_interval = min_refetch_interval
+        # fraction of the TTL after which the keys are refreshed in the
+        # background
+        self.refresh_ahead = refresh_ahead
+        self.timeout = timeout
+        self.fetches = 0
+        self._keys = {}
+        self._fetched_at = None
+        self._expires_at = 0
+        self._refresh_at = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def get(self, kid):
+        """The JWK with this kid, or None if the key set has no such key."""
+        now = time.time()
+        if self._fetched_at is None or now >= self._expires_at:
+            self._fetch_if(lambda: self._fetched_at is None
+                           or time.time() >= self._expires_at,
+                           keep_stale=self._fetched_at is not None)
+        elif now >= self._refresh_at:
+            self._refresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is None:
+            self._fetch_if(lambda: kid not in self._keys and
+                           time.time() >= self._fetched_at
+                           + self.min_refetch_interval, keep_stale=True)
+            key = self._keys.get(kid)
+        return key
+
+    def _fetch_if(self, needed, keep_stale):
+        # whoever gets the lock first fetches; the others find it done
+        with self._lock:
+            if not needed():
+                return
+            try:
+                self._fetch()
+            except Exception:
+                if not keep_stale:
+                    raise
+                # Auth0 unreachable: keep using the keys we have, and only
+                # try again after min_refetch_interval
+                self._fetched_at = time.time()
+                self._expires_at = self._refresh_at = \
+                    self._fetched_at + self.min_refetch_interval
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def refresh():
+            try:
+                self._fetch_if(lambda: time.time() >= self._refresh_at,
+                               keep_stale=True)
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=refresh, name='jwks-refresh',
+                         daemon=True).start()
+
+    def _fetch(self):
+        self.fetches += 1
+        with urlopen(self.url, timeout=self.timeout) as response:
+            jwks = json.loads(response.read())
+            ttl = max_age(response.headers.get('Cache-Control'))
+        if ttl is None:
+            ttl = self.default_ttl
+        ttl = max(ttl, self.min_refetch_interval)
+        self._keys = {key['kid']: key for key in jwks['keys']
+                      if 'kid' in key}
+        self._fetched_at = time.time()
+        self._expires_at = self._fetched_at + ttl
+        self._refresh_at = self._fetched_at + ttl * self.refresh_ahead
+
+
+def max_age(cache_control):
+    """Seconds a response may be cached for, per its Cache-Control."""
+    if not cache_control:
+        return None
+    if re.search(r'\b(no-cache|no-store)\b', cache_control):
+        return 0
+    match = re.search(r'\bmax-age=(\d+)', cache_control)
+    return int(match.group(1)) if match else None
@@ -0,0 +1,136 @@
+"""A local stand-in for Auth0's JWKS endpoint, for trying the API offline.
+
+    python jwks_stub.py [--port 8765] [--max-age 600]
+
+It serves a freshly generated RSA key set at /.well-known/jwks.json and
+prints the environment to run app.py against it, plus a token it signed.
+From Python, use it as a context manager:
+
+    with StubJWKS() as stub:
+        os.environ['JWKS_URL'] = stub.url
+        token = stub.token({'sub': 'user'})
+        stub.rotate()   # sign with a new key, as Auth0 does on rotation
+
+Keys are generated with pycryptodome (from requirements.txt) or, failing
+that, the rsa package that newer python-jose releases install.
+"""
+import argparse
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from jose import jwt
+
+
+def b64_uint(value):
+    data = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def generate_key(bits=2048):
+    """(private key PEM, modulus, public exponent) of a new RSA key."""
+    try:
+        from Crypto.PublicKey import RSA
+        key = RSA.generate(bits)
+        return key.export_key().decode('ascii'), key.n, key.e
+    except ImportError:
+        import rsa
+        public, private = rsa.newkeys(bits)
+        return private.save_pkcs1().decode('ascii'), public.n, public.e
+
+
+class StubJWKS:
+
+    def __init__(self, domain='fyyur.test.auth0.com', audience='fyyur',
+                 port=0, max_age=600):
+        self.domain = domain
+        self.audience = audience
+        self.max_age = max_age
+        self.requests = 0
+        self.keys = []
+        self.rotate()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/.well-known/jwks.json':
+                    self.send_error(404)
+                    return
+                stub.requests += 1
+                body = json.dumps(stub.jwks()).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Cache-Control',
+                                 'public, max-age={}'.format(stub.max_age))
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.url = 'http://127.0.0.1:{}/.well-known/jwks.json'.format(
+            self.server.server_port)
+
+    def rotate(self):
+        """Start signing with a new key; the old ones are still published."""
+        pem, n, e = generate_key()
+        kid = 'stub-{}'.format(len(self.keys) + 1)
+        self.keys.append((kid, pem, {
+            'kty': 'RSA', 'use': 'sig', 'alg': 'RS256',
+            'kid': kid, 'n': b64_uint(n), 'e': b64_uint(e)}))
+        return kid
+
+    def jwks(self):
+        return {'keys': [jwk for _, _, jwk in self.keys]}
+
+    def token(self, claims=None, expires_in=3600, kid=None):
+        """A token signed with the newest key (or `kid`), as Auth0 issues."""
+        kid, pem, _ = next(key for key in reversed(self.keys)
+                           if kid in (None, key[0]))
+        now = int(time.time())
+        payload = {'iss': 'https://{}/'.format(self.domain),
+                   'aud': self.audience, 'sub': 'stub|user',
+                   'iat': now, 'exp': now + expires_in}
+        payload.update(claims or {})
+        return jwt.encode(payload, pem, algorithm='RS256',
+                          headers={'kid': kid})
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-age', type=int, default=600)
+    parser.add_argument('--domain', default='fyyur.test.auth0.com')
+    parser.add_argument('--audience', default='fyyur')
+    args = parser.parse_args()
+
+    stub = StubJWKS(args.domain, args.audience, args.port, args.max_age)
+    print('export AUTH0_DOMAIN={}'.format(stub.domain))
+    print('export API_AUDIENCE={}'.format(stub.audience))
+    print('export JWKS_URL={}'.format(stub.url))
+    print()
+    print('Authorization: Bearer {}'.format(stub.token()))
+    stub.server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
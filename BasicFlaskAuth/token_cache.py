@@ -0,0 +1,69 @@
+"""Bounded LRU cache of verified JWT payloads.
+
+Checking an RS256 signature is by far the most expensive part of serving a
+protected request, and clients send the same bearer token over and over.
+Entries are keyed by a SHA-256 of the token (the cache never holds the
+tokens themselves) and dropped once the token's `exp` has passed, so a
+cached payload is never accepted for longer than the token itself. The
+token's `permissions` are kept as a frozenset, built once per token.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class VerifiedTokenCache:
+
+    def __init__(self, max_entries=1024):
+        # 0 disables the cache
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        """(payload, kid, permissions) cached for this token, or None."""
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1:]
+
+    def set(self, token, payload, kid, permissions):
+        expires = payload.get('exp')
+        if not self.max_entries or not isinstance(expires, (int, float)):
+            return
+        key = self.key(token)
+        with self._lock:
+            self._entries[key] = (expires, payload, kid, permissions)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, token):
+        with self._lock:
+            self._entries.pop(self.key(token), None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -1,4 +1,10 @@
-from flask import Flask, request, jsonify, abort
+import gzip
+import hashlib
+import os
+
+from flask import Flask, Response, request, jsonify, abort, json
+
+from greeting_store import CachedStore, create_store
 
 app = Flask(__name__)
 
@@ -12,13 +18,54 @@ greetings = {
             'ja': 'こんにちは'
             }
 
+# also keep a gzipped copy of the GET /greeting body, for clients that
+# accept it
+GZIP = os.environ.get('GREETINGS_GZIP', '1') != '0'
+
+
+def render(greetings):
+    """The GET /greeting body, encoded, zipped and tagged once per version of
+    the greetings: {content encoding: (etag, body)}."""
+    body = json.dumps({'greetings': greetings},
+                      separators=(',', ':')).encode('utf-8') + b'\n'
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    variants = {'identity': (etag, body)}
+    if GZIP:
+        # mtime=0 keeps the bytes, and so the tag, the same in every worker
+        variants['gzip'] = (etag + '-gzip', gzip.compress(body, mtime=0))
+    return variants
+
+
+def greetings_response(conditional=True):
+    variants = store.rendered()
+    encoding = 'gzip' if 'gzip' in variants and \
+        'gzip' in request.accept_encodings else 'identity'
+    etag, body = variants[encoding]
+    if conditional and request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    return response
+
+# 'memory' (per process, lost on restart), a SQLAlchemy URL such as
+# sqlite:///greetings.db, or redis://... ; an empty store starts with the
+# greetings above
+store = CachedStore(
+    create_store(os.environ.get('GREETINGS_STORE', 'memory'), greetings),
+    float(os.environ.get('GREETINGS_MAX_STALENESS', 0)), render)
+
 @app.route('/greeting', methods=['GET'])
 def greeting_all():
-    return jsonify({'greetings': greetings})
+    return greetings_response()
 
 @app.route('/greeting/<lang>', methods=['GET'])
 def greeting_one(lang):
     print(lang)
+    greetings = store.greetings()
     if(lang not in greetings):
         abort(404)
     return jsonify({'greeting': greetings[lang
@@ -29,5 +76,5 @@ def greeting_add():
     info = request.get_json()
     if('lang' not in info or 'greeting' not in info):
         abort(422)
-    greetings[info['lang']] = info['greeting']
-    return jsonify({'greetings':greetings})
+    store.add(info['lang'], info['greeting'])
+    return greetings_response(conditional=False)
@@ -0,0 +1,161 @@
+"""Throughput of GET /greeting: encoding the greetings on every request, as
+jsonify did, against the precomputed body, gzipped body and 304s.
+
+    python benchmarks/load_test.py [--greetings N] [--clients C]
+                                   [--seconds S] [--url URL]
+
+Starts the app in a separate process (or uses --url), adds N greetings so
+the body is not trivially small, then lets C keep-alive clients request it
+for S seconds per scenario and prints requests per second.
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# GET /greeting-jsonify is the old greeting_all, added only by this script
+SCENARIOS = [
+    ('jsonify per request', '/greeting-jsonify', {}),
+    ('precomputed', '/greeting', {}),
+    ('precomputed, gzip', '/greeting', {'Accept-Encoding': 'gzip'}),
+    ('304 Not Modified', '/greeting', None),
+]
+
+
+def serve(port):
+    sys.path.insert(0, ROOT)
+    from flask import jsonify
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from FlaskRecap import app, store
+
+    @app.route('/greeting-jsonify', methods=['GET'])
+    def greeting_jsonify():
+        return jsonify({'greetings': store.greetings()})
+
+    class KeepAlive(WSGIRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # headers and body go out in separate writes; don't let them wait
+        # on delayed ACKs
+        disable_nagle_algorithm = True
+
+        def log_request(self, *args):
+            pass
+
+    make_server('127.0.0.1', port, app, threaded=True,
+                request_handler=KeepAlive).serve_forever()
+
+
+def start_server():
+    """(base URL, process) of the app served by this script."""
+    import socket
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen([sys.executable, __file__, '--serve',
+                                str(port)], cwd=ROOT)
+    url = 'http://127.0.0.1:{}'.format(port)
+    for _ in range(100):
+        try:
+            request(url, 'GET', '/greeting')
+            return url, process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise SystemExit('the app did not start')
+
+
+def request(url, method, path, body=None, headers=None):
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port)
+    try:
+        connection.request(method, path, body, headers or {})
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+
+def load(url, path, headers, clients, seconds):
+    """Requests per second that `clients` connections get through."""
+    parts = urlsplit(url)
+    deadline = time.perf_counter() + seconds
+    counts = [0] * clients
+    errors = []
+
+    def client(i):
+        connection = http.client.HTTPConnection(parts.hostname, parts.port)
+        try:
+            while time.perf_counter() < deadline:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status not in (200, 304):
+                    errors.append(response.status)
+                    return
+                counts[i] += 1
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=client, args=(i,))
+               for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise SystemExit('{} answered {}'.format(path, errors[0]))
+    return sum(counts) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--greetings', type=int, default=500)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--url', help='a running server; it needs '
+                        'GET /greeting-jsonify for the first scenario')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve)
+        return
+
+    process = None
+    url = args.url
+    if url is None:
+        url, process = start_server()
+    try:
+        for i in range(args.greetings):
+            request(url, 'POST', '/greeting', json.dumps({
+                'lang': 'x-load-{}'.format(i),
+                'greeting': 'greeting number {}'.format(i)}),
+                {'Content-Type': 'application/json'})
+        _, headers, body = request(url, 'GET', '/greeting')
+        print('{} greetings, {} byte body, {} clients, {:g}s each'.format(
+            len(json.loads(body)['greetings']), len(body), args.clients,
+            args.seconds))
+
+        baseline = None
+        for name, path, extra in SCENARIOS:
+            if extra is None:
+                extra = {'If-None-Match': headers['ETag']}
+            rate = load(url, path, extra, args.clients, args.seconds)
+            baseline = baseline or rate
+            print('{:<22}{:>9.0f} req/s  ({:.2f}x)'.format(
+                name, rate, rate / baseline))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""Where the greetings live.
+
+Every store offers the same three calls:
+
+    version()    a number that changes whenever a greeting is added
+    snapshot()   (version, {lang: greeting}) read together
+    add(lang, greeting)
+
+MemoryStore keeps them in the process, as the app always did. SQLStore
+(any SQLAlchemy URL, e.g. sqlite:///greetings.db) and RedisStore (Redis or
+anything speaking its protocol) keep them on disk / in a server, so they
+survive restarts and every worker sees the same greetings.
+
+CachedStore wraps any of them for the routes: it keeps a snapshot in the
+worker and only reloads it when the store's version has moved, so a read is
+a version check plus dictionary lookups. Given a `render` function it also
+keeps what that makes of the greetings (an encoded response body, say),
+computed once per version instead of once per request.
+"""
+import threading
+import time
+
+
+class MemoryStore:
+
+    def __init__(self, defaults=None):
+        self._greetings = dict(defaults or {})
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def version(self):
+        return self._version
+
+    def snapshot(self):
+        with self._lock:
+            return self._version, dict(self._greetings)
+
+    def add(self, lang, greeting):
+        with self._lock:
+            self._greetings[lang] = greeting
+            self._version += 1
+            return self._version
+
+
+class SQLStore:
+
+    def __init__(self, url, defaults=None):
+        # optional dependency, only needed for this backend
+        import sqlalchemy as sa
+        self.sa = sa
+        self.engine = sa.create_engine(url)
+        metadata = sa.MetaData()
+        self.greetings = sa.Table(
+            'greetings', metadata,
+            sa.Column('lang', sa.String(32), primary_key=True),
+            sa.Column('greeting', sa.Text, nullable=False))
+        # a single row, bumped in the same transaction as every write
+        self.versions = sa.Table(
+            'greetings_version', metadata,
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('version', sa.Integer, nullable=False))
+        # every worker runs this on start, often at the same moment
+        for attempt in range(3):
+            try:
+                metadata.create_all(self.engine)
+                break
+            except sa.exc.DBAPIError:
+                # another worker created a table between our check and our
+                # CREATE; the next try skips it
+                if attempt == 2:
+                    raise
+        try:
+            with self.engine.begin() as connection:
+                if connection.execute(
+                        sa.select(self.versions.c.id)).first() is None:
+                    connection.execute(self.versions.insert(),
+                                       {'id': 1, 'version': 0})
+                    if defaults:
+                        connection.execute(self.greetings.insert(), [
+                            {'lang': lang, 'greeting': greeting}
+                            for lang, greeting in defaults.items()])
+        except sa.exc.IntegrityError:
+            # another worker seeded the store first, in its own transaction
+            pass
+
+    def version(self):
+        with self.engine.connect() as connection:
+            return connection.execute(
+                self.sa.select(self.versions.c.version)).scalar()
+
+    def snapshot(self):
+        with self.engine.begin() as connection:
+            version = connection.execute(
+                self.sa.select(self.versions.c.version)).scalar()
+            rows = connection.execute(self.sa.select(
+                self.greetings.c.lang, self.greetings.c.greeting))
+            return version, dict(rows.fetchall())
+
+    def add(self, lang, greeting):
+        with self.engine.begin() as connection:
+            # bumping the version first also makes concurrent writers queue
+            # up behind the row lock
+            connection.execute(self.versions.update().values(
+                version=self.versions.c.version + 1))
+            updated = connection.execute(
+                self.greetings.update().where(
+                    self.greetings.c.lang == lang).values(greeting=greeting))
+            if not updated.rowcount:
+                connection.execute(self.greetings.insert(),
+                                   {'lang': lang, 'greeting': greeting})
+            return connection.execute(
+                self.sa.select(self.versions.c.version)).scalar()
+
+
+class RedisStore:
+
+    def __init__(self, url=None, defaults=None, client=None,
+                 prefix='greetings'):
+        if client is None:
+            # optional dependency, only needed for this backend
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.key = prefix
+        self.version_key = prefix + ':version'
+        if self.client.set(self.version_key, 0, nx=True) and defaults:
+            self.add_many(defaults)
+
+    def version(self):
+        return int(self.client.get(self.version_key) or 0)
+
+    def snapshot(self):
+        version, greetings = self.client.pipeline().get(
+            self.version_key).hgetall(self.key).execute()
+        return int(version or 0), {
+            lang.decode('utf-8'): greeting.decode('utf-8')
+            for lang, greeting in greetings.items()}
+
+    def add(self, lang, greeting):
+        return self.add_many({lang: greeting})
+
+    def add_many(self, greetings):
+        return self.client.pipeline().hset(
+            self.key, mapping=greetings).incr(
+            self.version_key).execute()[-1]
+
+
+def create_store(url, defaults=None):
+    """The store for GREETINGS_STORE: 'memory', redis://... or a
+    SQLAlchemy database URL."""
+    if url == 'memory':
+        return MemoryStore(defaults)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStore(url, defaults)
+    return SQLStore(url, defaults)
+
+
+class CachedStore:
+
+    def __init__(self, store, max_staleness=0, render=None):
+        self.store = store
+        self.render = render
+        # seconds a worker may go on using its snapshot without asking the
+        # store for its version; 0 asks on every read
+        self.max_staleness = max_staleness
+        self._state = store.snapshot()
+        self._checked = time.monotonic()
+        # (state it was rendered from, render(greetings))
+        self._rendered = None
+
+    def greetings(self):
+        """{lang: greeting}, shared by every request: do not modify it."""
+        version, greetings = self._state
+        now = time.monotonic()
+        if now - self._checked >= self.max_staleness:
+            self._checked = now
+            if self.store.version() != version:
+                self._state = self.store.snapshot()
+        return self._state[1]
+
+    def rendered(self):
+        """render(greetings), redone only when the greetings have changed."""
+        self.greetings()
+        state, rendered = self._state, self._rendered
+        if rendered is None or rendered[0] is not state:
+            rendered = self._rendered = (state, self.render(state[1]))
+        return rendered[1]
+
+    def add(self, lang, greeting):
+        self.store.add(lang, greeting)
+        self._state = self.store.snapshot()
+        self._checked = time.monotonic()
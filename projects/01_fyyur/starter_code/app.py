@@ -2,43 +2,275 @@
 # Imports
 # ----------------------------------------------------------------------------#
 
+import csv
+import io
 import json
 from pickle import FALSE
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+from flask import Flask, Blueprint, render_template, request, Response, flash, redirect, url_for, abort, \
+    jsonify, stream_with_context, current_app, has_request_context, \
+    session as user_session, make_response
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
 import logging
 from logging import Formatter, FileHandler
-from flask_wtf import Form
-from flask_migrate import Migrate
-from forms import *
-from sqlalchemy import create_engine, exc, func, and_
+from cache import create_cache
+from sqlalchemy import create_engine, exc, func, and_, or_, event, select, case, \
+    literal
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool
+from sqlalchemy import orm
+from sqlalchemy.orm import selectinload
 from markupsafe import Markup
+import re
 import sys
 import time
+import sqlite3
+import itertools
+import functools
+import random
+import click
+import hashlib
+import os
+import importlib.util
+import threading
+import zlib
+from datetime import datetime, timedelta, timezone
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import is_resource_modified
+from werkzeug.local import LocalProxy
+
+
+def lazy_import(name):
+    """Import `name` now, but only run its code when an attribute is used."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    if '.' in name:
+        # as the import statement does, so `import babel.dates` elsewhere
+        # finds babel.dates on babel
+        parent, _, child = name.rpartition('.')
+        setattr(sys.modules[parent], child, module)
+    return module
+
+
+# Only needed by some requests, so workers start without them (see
+# benchmarks/startup.py). Flask-Migrate is imported by create_app() when the
+# `flask db` commands may need it.
+babel_dates = lazy_import('babel.dates')
+dateutil_parser = lazy_import('dateutil.parser')
+flask_moment = lazy_import('flask_moment')
+forms = lazy_import('forms')
 
 
 # ----------------------------------------------------------------------------#
 # App Config.
 # ----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+def reads_from_replica():
+    """Whether the current request may read from a replica.
 
-# TODO: connect to a local postgresql database
+    Only GET/HEAD requests do, and not from a client that wrote less than
+    REPLICA_LAG_TOLERANCE seconds ago, so a redirect after a write still
+    sees it.
+    """
+    if not has_request_context() or request.method not in ('GET', 'HEAD'):
+        return False
+    return user_session.get('read_primary_until', 0) < time.time()
+
+
+class RoutingSession(SignallingSession):
+    """Session that sends reads to a random replica when allowed.
+
+    Flushes, and everything outside GET/HEAD requests, stay on the primary.
+    A session (that is, a request) keeps to the replica it first picked, so
+    all its reads see the same point of the replication stream.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replicas = self.app.extensions.get('replica_engines')
+        if replicas and not self._flushing and reads_from_replica():
+            if 'replica' not in self.info:
+                self.info['replica'] = random.choice(replicas)
+            return self.info['replica']
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+db = RoutingSQLAlchemy()
+bp = Blueprint('main', __name__, cli_group=None)
+
+
+def engine_options(config, uri=None):
+    """SQLAlchemy engine options for the configured database.
+
+    Pool sizing and statement timeouts only apply to server databases;
+    SQLite keeps Flask-SQLAlchemy's defaults.
+    """
+    uri = uri or config['SQLALCHEMY_DATABASE_URI']
+    if uri.startswith('sqlite'):
+        return {}
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if config['DB_STATEMENT_TIMEOUT'] and uri.startswith('postgres'):
+        options['connect_args'] = {
+            'options': '-c statement_timeout={}'.format(
+                config['DB_STATEMENT_TIMEOUT'])}
+    return options
+
+
+def create_app(config=None):
+    """Build a Fyyur app.
+
+    Settings come from config.py; `config` (an object, import path or dict)
+    overrides them, which is how tests point an app at their own database.
+    """
+    app = Flask(__name__)
+    app.config.from_object('config')
+    if isinstance(config, dict):
+        app.config.from_mapping(config)
+    elif config is not None:
+        app.config.from_object(config)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(
+        engine_options(app.config),
+        **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.extensions['cache'] = create_cache(app.config)
+    app.extensions['replica_engines'] = [
+        create_engine(uri, **engine_options(app.config, uri))
+        for uri in app.config['SQLALCHEMY_REPLICA_URIS']]
+
+    if app.config['TEMPLATE_CACHE_DIR']:
+        os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+        app.jinja_options = dict(app.jinja_options, bytecode_cache=(
+            FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])))
+
+    app.context_processor(lambda: {'moment': moment})
+    db.init_app(app)
+    if not app.config['WEB_WORKER']:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    app.register_blueprint(bp)
+    app.register_blueprint(api)
+    if app.config['WEB_WORKER']:
+        compile_templates(app)
+    if app.config['JOBS_IN_PROCESS']:
+        app.before_request(start_job_thread)
+
+    if not app.debug and not app.testing:
+        file_handler = FileHandler('error.log')
+        file_handler.setFormatter(Formatter(
+            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
+        app.logger.setLevel(logging.INFO)
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
+        app.logger.info('errors')
+
+    return app
+
+
+# The `moment` template global Flask-Moment's context processor provides,
+# imported the first time a template uses it
+moment = LocalProxy(lambda: flask_moment._moment)
+
+
+def compile_templates(app):
+    """Load every template, so requests never wait for Jinja to compile one.
+
+    With TEMPLATE_CACHE_DIR set the compiled code is also written there, and
+    later workers load it instead of parsing the sources again.
+    """
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
+
+
+@bp.cli.command('compile-templates')
+def compile_templates_command():
+    """Fill TEMPLATE_CACHE_DIR with compiled templates, e.g. on deploy."""
+    if not current_app.config['TEMPLATE_CACHE_DIR']:
+        raise click.UsageError('TEMPLATE_CACHE_DIR is not set')
+    names = compile_templates(current_app)
+    click.echo('{} templates compiled into {}'.format(
+        len(names), current_app.config['TEMPLATE_CACHE_DIR']))
 
 # ----------------------------------------------------------------------------#
 # Models.
 # ----------------------------------------------------------------------------#
 
 
+def utc_now():
+    return datetime.now(timezone.utc)
+
+
+# Show lengths in minutes. Bounding them is what lets the double-booking
+# check look only at shows that started shortly before a new one.
+DEFAULT_SHOW_DURATION = 120
+MAX_SHOW_DURATION = 24 * 60
+
+
+venue_genres = db.Table(
+    'venue_genres',
+    db.Column(
+        'venue_id',
+        db.Integer,
+        db.ForeignKey(
+            'Venue.id',
+            ondelete="CASCADE"),
+        primary_key=True),
+    db.Column(
+        'genre_id',
+        db.Integer,
+        db.ForeignKey(
+            'Genre.id',
+            ondelete="CASCADE"),
+        primary_key=True,
+        index=True))
+
+artist_genres = db.Table(
+    'artist_genres',
+    db.Column(
+        'artist_id',
+        db.Integer,
+        db.ForeignKey(
+            'Artist.id',
+            ondelete="CASCADE"),
+        primary_key=True),
+    db.Column(
+        'genre_id',
+        db.Integer,
+        db.ForeignKey(
+            'Genre.id',
+            ondelete="CASCADE"),
+        primary_key=True,
+        index=True))
+
+
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), unique=True, nullable=False)
+
+
 class Show(db.Model):
     __tablename__ = "Show"
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(
@@ -56,8 +288,23 @@ class Show(db.Model):
     start_time = db.Column(
         db.DateTime(
             timezone=True),
-        onupdate=func.now(),
         nullable=True)
+    duration = db.Column(
+        db.Integer,
+        default=DEFAULT_SHOW_DURATION,
+        server_default=str(DEFAULT_SHOW_DURATION),
+        nullable=False)
+    # start_time + duration, stored so overlaps can be found (and, on
+    # Postgres, excluded by a constraint) through an index
+    end_time = db.Column(
+        db.DateTime(
+            timezone=True),
+        nullable=True)
+    updated_at = db.Column(
+        db.DateTime(
+            timezone=True),
+        default=utc_now,
+        nullable=False)
     artist = db.relationship("Artist", backref="show_artists", lazy=True)
     venue = db.relationship("Venue", backref="show_venues", lazy=True)
     #db.Column('start_time', db.DateTime(timezone=True), onupdate=func.now(), nullable=True)
@@ -71,13 +318,22 @@ class Venue(db.Model):
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
+    genres = db.relationship(
+        "Genre",
+        secondary=venue_genres,
+        order_by=Genre.name,
+        lazy=True)
     image_link = db.Column(db.String(500))
     seeking_talent = db.Column(db.Boolean, nullable=True, default=False)
     seeking_description = db.Column(db.String(500))
+    updated_at = db.Column(
+        db.DateTime(
+            timezone=True),
+        default=utc_now,
+        nullable=False)
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
-    num_upcoming_shows = db.Column(db.Integer)
+    num_upcoming_shows = db.Column(db.Integer, default=0)
     show = db.relationship(
         "Show",
         backref="venue_shows",
@@ -90,7 +346,8 @@ class Venue(db.Model):
             "id": self.id,
             "name": self.name,
             "city": self.city,
-            "state": self.state
+            "state": self.state,
+            "num_upcoming_shows": self.num_upcoming_shows or 0
         }
 
     # TODO: implement any missing fields, as a database migration using
@@ -104,12 +361,21 @@ class Artist(db.Model):
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
+    genres = db.relationship(
+        "Genre",
+        secondary=artist_genres,
+        order_by=Genre.name,
+        lazy=True)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, nullable=True, default=False)
     seeking_description = db.Column(db.String(500))
+    updated_at = db.Column(
+        db.DateTime(
+            timezone=True),
+        default=utc_now,
+        nullable=False)
     show = db.relationship(
         "Show",
         backref="artist_shows",
@@ -129,28 +395,469 @@ class Artist(db.Model):
 # TODO Implement Show and Artist models, and complete all model
 # relationships and properties, as a database migration.
 
+def genres_from_names(names):
+    """Genre rows for the given names, creating the ones not seen before."""
+    names = list(dict.fromkeys(
+        name.strip() for name in names if name and name.strip()))
+    if not names:
+        return []
+    existing = {genre.name: genre for genre in
+                Genre.query.filter(Genre.name.in_(names))}
+    return [existing.get(name) or Genre(name=name) for name in names]
+
+
+# updated_at feeds the Last-Modified/ETag validators of the detail pages. It
+# is set on every flushed change, including genre-only ones, and a show
+# write also touches its venue and artist, whose pages list it.
+
+@event.listens_for(Venue, 'before_update')
+@event.listens_for(Artist, 'before_update')
+@event.listens_for(Show, 'before_update')
+def set_updated_at(mapper, connection, target):
+    target.updated_at = utc_now()
+
+
+@event.listens_for(Show, 'before_insert')
+@event.listens_for(Show, 'before_update')
+def set_end_time(mapper, connection, target):
+    if target.start_time is None:
+        target.end_time = None
+    else:
+        target.end_time = target.start_time + timedelta(
+            minutes=target.duration or DEFAULT_SHOW_DURATION)
+
+
+def touch(connection, model, ids):
+    table = model.__table__
+    connection.execute(
+        table.update().where(
+            table.c.id.in_(ids)).values(
+            updated_at=utc_now()))
+
+
+@event.listens_for(Show, 'after_insert')
+@event.listens_for(Show, 'after_update')
+@event.listens_for(Show, 'after_delete')
+def touch_show_owners(mapper, connection, target):
+    touch(connection, Venue, [target.venue_id])
+    touch(connection, Artist, [target.artist_id])
+
+
+# ----------------------------------------------------------------------------#
+# Aggregates.
+# ----------------------------------------------------------------------------#
+
+# Venue.num_upcoming_shows is kept up to date by these listeners when shows
+# are booked or removed, moved forward by `flask advance-upcoming` (run it
+# from cron) as shows start, and can be recomputed from scratch with
+# `flask rebuild-upcoming`.
+
+
+def _bump_upcoming(connection, show, delta):
+    venue_table = Venue.__table__
+    show_table = Show.__table__
+    still_upcoming = select(show_table.c.id).where(
+        and_(
+            show_table.c.id == show.id,
+            show_table.c.start_time >= datetime.now())).exists()
+    connection.execute(
+        venue_table.update().where(
+            and_(
+                venue_table.c.id == show.venue_id,
+                still_upcoming)).values(
+            num_upcoming_shows=func.coalesce(
+                venue_table.c.num_upcoming_shows, 0) + delta))
+
+
+@event.listens_for(Show, 'after_insert')
+def show_inserted(mapper, connection, target):
+    _bump_upcoming(connection, target, 1)
+
+
+@event.listens_for(Show, 'before_delete')
+def show_deleted(mapper, connection, target):
+    _bump_upcoming(connection, target, -1)
+
+
+def refresh_upcoming_counts(venue_ids=None):
+    """Recompute Venue.num_upcoming_shows from the Show table.
+
+    Only the given venues are refreshed; all venues when venue_ids is None.
+    The update is part of the session's transaction, for the caller to
+    commit.
+    """
+    upcoming = select(func.count(Show.id)).where(
+        and_(
+            Show.venue_id == Venue.id,
+            Show.start_time >= datetime.now())).scalar_subquery()
+    query = Venue.__table__.update().values(num_upcoming_shows=upcoming)
+    if venue_ids is not None:
+        if not venue_ids:
+            return 0
+        query = query.where(Venue.id.in_(venue_ids))
+    result = db.session.execute(query)
+    mark_venues_listing_stale()
+    return result.rowcount
+
+
+def advance_upcoming_counts(window):
+    """Refresh the venues whose shows started within the last `window`."""
+    now = datetime.now()
+    started = db.session.query(Show.venue_id).filter(
+        and_(
+            Show.start_time >= now - window,
+            Show.start_time < now)).distinct().all()
+    return refresh_upcoming_counts({venue_id for venue_id, in started})
+
+
+@bp.cli.command('rebuild-upcoming')
+def rebuild_upcoming_command():
+    """Reconcile every venue's upcoming show count with the Show table."""
+    count = refresh_upcoming_counts()
+    db.session.commit()
+    click.echo('{} venues rebuilt'.format(count))
+
+
+@bp.cli.command('advance-upcoming')
+@click.option('--minutes', default=60, show_default=True,
+              help='How far back to look for shows that have started.')
+def advance_upcoming_command(minutes):
+    """Move shows that have started from upcoming to past."""
+    count = advance_upcoming_counts(timedelta(minutes=minutes))
+    db.session.commit()
+    click.echo('{} venues advanced'.format(count))
+
+def venue_areas(genre=None):
+    """Venues grouped by city and state, with per-area upcoming totals.
+
+    When genre is given only venues tagged with it are listed.
+    """
+    venues = db.session.query(
+        Venue.city,
+        Venue.state,
+        Venue.id,
+        Venue.name,
+        Venue.num_upcoming_shows)
+    if genre:
+        venues = venues.join(Venue.genres).filter(Genre.name == genre)
+    venues = venues.order_by(
+        Venue.state,
+        Venue.city,
+        Venue.name).all()
+
+    # one query, so the areas and their venues always agree
+    data = []
+    for (city, state), rows in itertools.groupby(
+            venues, lambda venue: (venue.city, venue.state)):
+        area_venues = [{
+            "id": venue.id,
+            "name": venue.name,
+            "num_upcoming_shows": venue.num_upcoming_shows or 0
+        } for venue in rows]
+        data.append({
+            "city": city,
+            "state": state,
+            "num_upcoming_shows": sum(
+                venue["num_upcoming_shows"] for venue in area_venues),
+            "venues": area_venues
+        })
+    return data
+
+
+# Rendered /venues listings, one per genre filter, kept in
+# app.extensions['cache'] under the 'venues' version. A transaction that
+# wrote a Venue or Show bumps it when it commits, which retires every
+# listing at once, in every worker when the cache is shared. Listings also
+# expire after VENUES_CACHE_TIMEOUT seconds, which bounds how long another
+# worker's write goes unnoticed with the per-process 'lru' cache.
+
+
+def mark_venues_listing_stale():
+    db.session.info['venues_listing_stale'] = True
+
+
+@event.listens_for(Venue, 'after_insert')
+@event.listens_for(Venue, 'after_update')
+@event.listens_for(Venue, 'after_delete')
+@event.listens_for(Show, 'after_insert')
+@event.listens_for(Show, 'after_update')
+@event.listens_for(Show, 'after_delete')
+def venues_written(mapper, connection, target):
+    mark_venues_listing_stale()
+
+
+@event.listens_for(db.session, 'after_commit')
+def drop_venues_listing(session):
+    if session.info.pop('venues_listing_stale', False):
+        cache = current_app.extensions['cache']
+        cache.bump('venues')
+        # lets venues() know replicas may not have this write yet
+        lag = current_app.config['REPLICA_LAG_TOLERANCE']
+        if current_app.extensions['replica_engines'] and lag:
+            cache.set('venues:dropped', time.time(), lag)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def keep_venues_listing(session):
+    session.info.pop('venues_listing_stale', None)
+
+
+# A client that has just written reads from the primary for a while, until
+# the replicas have caught up with its write.
+
+@event.listens_for(db.session, 'after_flush')
+def session_wrote(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def pin_client_to_primary(session):
+    if session.info.pop('wrote', False) and has_request_context():
+        user_session['read_primary_until'] = time.time() + \
+            current_app.config['REPLICA_LAG_TOLERANCE']
+
+
+@event.listens_for(db.session, 'after_rollback')
+def forget_writes(session):
+    session.info.pop('wrote', None)
+
+
+# ----------------------------------------------------------------------------#
+# Detail page cache.
+# ----------------------------------------------------------------------------#
+
+# The bodies of /venues/<id> and /artists/<id> are cached in
+# app.extensions['cache'] (see cache.py) under the page's ETag. The ETag is
+# computed for every request anyway (see page_validators) and changes with
+# anything the page shows, so a changed page is never found under the new
+# tag, in any worker. It is also read in the same transaction, from the same
+# replica, as the data rendered under it, so a lagging replica cannot file
+# old data under a new tag.
+
+
+def detail_fragment(kind, entity_id, etag, load):
+    """Cached {'name', 'html'} body of a venue or artist page.
+
+    etag is the page's, from page_validators(). load(entity_id) returns the
+    template data and the start time of the next upcoming show (or None).
+    """
+    cache = current_app.extensions['cache']
+    key = '{}:{}:{}'.format(kind, entity_id, etag)
+    cached = cache.get(key)
+    if cached is not None:
+        return json.loads(cached)
+
+    data, next_start = load(entity_id)
+    fragment = {
+        "name": data["name"],
+        "html": render_template(
+            'pages/{}_detail.html'.format(kind), **{kind: data})
+    }
+    # the tag changes when the next show starts, so there is no point in
+    # keeping the entry any longer
+    timeout = current_app.config['DETAIL_CACHE_TIMEOUT']
+    if next_start is not None:
+        timeout = min(timeout, max(next_start.timestamp() - time.time(), 1))
+    cache.set(key, json.dumps(fragment), timeout)
+    return fragment
+
+
+# ----------------------------------------------------------------------------#
+# Conditional requests.
+# ----------------------------------------------------------------------------#
+
+# A venue page changes when the venue, one of its shows (which touches the
+# venue, see touch_show_owners) or one of the artists playing there changes,
+# and when one of its shows starts and moves from upcoming to past. The
+# validators cover all of these, so unchanged pages are answered with 304
+# before anything is loaded or rendered. The same goes for artist pages.
+
+
+def as_utc(moment, naive_is_utc=True):
+    if moment.tzinfo is None:
+        # SQLite hands back naive values: updated_at is stored in UTC,
+        # start_time in local time
+        return moment.replace(tzinfo=timezone.utc) if naive_is_utc \
+            else moment.astimezone(timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def page_validators(kind, entity_id):
+    """(etag, last_modified) of a venue or artist page, or None if missing."""
+    if kind == 'venue':
+        model, other = Venue, Artist
+        owner_id, other_id = Show.venue_id, Show.artist_id
+    else:
+        model, other = Artist, Venue
+        owner_id, other_id = Show.artist_id, Show.venue_id
+    now = datetime.now()
+    row = db.session.query(
+        model.updated_at,
+        func.max(other.updated_at),
+        func.max(case((Show.start_time < now, Show.start_time)))).outerjoin(
+        Show,
+        owner_id == model.id).outerjoin(
+        other,
+        other.id == other_id).filter(
+        model.id == entity_id).group_by(
+        model.id).first()
+    if row is None:
+        return None
+
+    updated_at, related_updated_at, last_started = row
+    moments = [as_utc(updated_at)]
+    if related_updated_at is not None:
+        moments.append(as_utc(related_updated_at))
+    if last_started is not None:
+        moments.append(as_utc(last_started, naive_is_utc=False))
+    etag = hashlib.sha1('{}:{}:{}'.format(
+        kind, entity_id, [moment.isoformat() for moment in moments]).encode(
+        'utf-8')).hexdigest()
+    return etag, max(moments)
+
+
+def conditional_page(kind, entity_id, render):
+    """Answer with 304 if the client's copy is current, else render(etag)."""
+    validators = page_validators(kind, entity_id)
+    if validators is None:
+        abort(404)
+    etag, last_modified = validators
+
+    # pending flashed messages are part of the page, so send it in full
+    has_flashes = '_flashes' in user_session
+    if not has_flashes and not is_resource_modified(
+            request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+    else:
+        response = make_response(render(etag))
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    if has_flashes:
+        response.cache_control.private = True
+    return response
+
+
+# ----------------------------------------------------------------------------#
+# Search.
+# ----------------------------------------------------------------------------#
+
+# On Postgres, name searches are served by the pg_trgm GIN indexes created in
+# migration 3c1f0b7d9a2e and ranked with similarity(). SQLite has neither, so
+# the same similarity() is registered below as a Python function, which keeps
+# the queries identical across both databases.
+
+
+def trigrams(text):
+    """The set of trigrams pg_trgm extracts from text."""
+    grams = set()
+    for word in re.findall(r'\w+', (text or '').lower()):
+        word = '  ' + word + ' '
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+def trigram_similarity(left, right):
+    left, right = trigrams(left), trigrams(right)
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+@event.listens_for(Engine, 'connect')
+def register_sqlite_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function(
+            'similarity', 2, trigram_similarity, deterministic=True)
+
+
+def search_names(model, search_term, *columns):
+    """Query for model rows whose name contains search_term, best first."""
+    pattern = '%{}%'.format(
+        search_term.replace('\\', '\\\\').replace(
+            '%', '\\%').replace('_', '\\_'))
+    return db.session.query(*(columns or (model.id, model.name))).filter(
+        model.name.ilike(pattern, escape='\\')).order_by(
+        func.similarity(model.name, search_term).desc(),
+        model.name,
+        model.id)
+
+
+def search_page(model, search_term, page):
+    """One page of search results, counted in the same statement."""
+    per_page = current_app.config['SEARCH_PER_PAGE']
+    page = max(page, 1)
+    rows = search_names(
+        model,
+        search_term,
+        model.id,
+        model.name,
+        func.count().over().label('total')).limit(per_page).offset(
+        (page - 1) * per_page).all()
+    if rows:
+        total = rows[0].total
+    elif page > 1:
+        # past the last page, where there is no row to carry the count
+        total = search_names(model, search_term, model.id).order_by(
+            None).count()
+    else:
+        total = 0
+    last_page = max((total + per_page - 1) // per_page, 1)
+    return {
+        "count": total,
+        "data": rows,
+        "page": page,
+        "next_page": page + 1 if page * per_page < total else None,
+        "prev_page": min(page - 1, last_page) if page > 1 else None
+    }
+
+
+def typeahead(model):
+    search_term = request.args.get('search_term', '').strip()
+    if not search_term:
+        return jsonify({"data": []})
+    rows = search_names(model, search_term).limit(
+        current_app.config['TYPEAHEAD_LIMIT'])
+    return jsonify({"data": [{"id": row.id, "name": row.name}
+                             for row in rows]})
+
+
 # ----------------------------------------------------------------------------#
 # Filters.
 # ----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
 
 
-app.jinja_env.filters['datetime'] = format_datetime
+@functools.lru_cache(maxsize=64)
+def compiled_datetime_format(format, locale):
+    """Parsed Babel pattern and locale, built once per (format, locale)."""
+    pattern = DATETIME_FORMATS.get(format, format)
+    return (babel_dates.parse_pattern(pattern),
+            babel_dates.Locale.parse(locale))
+
+
+@bp.app_template_filter('datetime')
+def format_datetime(value, format='medium', locale='en'):
+    # controllers pass datetimes; strings are still accepted and parsed
+    if isinstance(value, str):
+        value = dateutil_parser.parse(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    pattern, locale = compiled_datetime_format(format, locale)
+    return pattern.apply(value, locale)
+
 
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
 
 
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('pages/home.html')
 
@@ -158,17 +865,32 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@bp.route('/venues')
 def venues():
-    # TODO: replace with real venues data.
-    # num_upcoming_shows should be aggregated based on number of upcoming
-    # shows per venue.
-    venue = Venue.query.all()
-    data = [ven.intelligence() for ven in venue]
-    return render_template('pages/venues.html', areas=data)
-
-
-@app.route('/venues/search', methods=['POST'])
+    # The listing is cached as a rendered fragment rather than as the whole
+    # page, so flashed messages in the layout are never shared.
+    genre = request.args.get('genre') or None
+    cache = current_app.extensions['cache']
+    key = 'venues:v{}:{}'.format(cache.version('venues'), genre or '')
+    listing = cache.get(key)
+    if listing is None:
+        areas = venue_areas(genre)
+        listing = render_template('pages/venue_areas.html', areas=areas)
+        timeout = current_app.config['VENUES_CACHE_TIMEOUT']
+        # a replica may not have the write that bumped the version yet
+        if current_app.extensions['replica_engines'] and \
+                cache.get('venues:dropped') is not None:
+            timeout = min(timeout,
+                          current_app.config['REPLICA_LAG_TOLERANCE'])
+        # only genres that have venues are cached, so made-up ?genre=
+        # values cannot fill the cache
+        if areas or not genre:
+            cache.set(key, listing, timeout)
+    listing = Markup(listing)
+    return render_template('pages/venues.html', listing=listing)
+
+
+@bp.route('/venues/search', methods=['POST'])
 def search_venues():
     # TODO: implement search on venues with partial string search. Ensure it is case-insensitive.
     # seach for Hop should return "The Musical Hop".
@@ -176,15 +898,8 @@ def search_venues():
     # Music & Coffee"
 
     search_term = request.form.get('search_term', '')
-    search_word = Venue.query.filter(
-        Venue.name.ilike(
-            '%{}%'.format(search_term)))
-    list_id = [venue.id for venue in search_word]
-
-    response = {
-        "count": len(list_id),
-        "data": search_word
-    }
+    page = request.form.get('page', 1, type=int)
+    response = search_page(Venue, search_term, page)
     return render_template(
         'pages/search_venues.html',
         results=response,
@@ -193,46 +908,63 @@ def search_venues():
             ''))
 
 
-@app.route('/venues/<int:venue_id>')
+@bp.route('/venues/search.json')
+def search_venues_json():
+    # id/name matches for the search box's autocomplete
+    return typeahead(Venue)
+
+
+@bp.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
 
     # shows the venue page with the given venue_id
+    return conditional_page('venue', venue_id, lambda etag: render_template(
+        'pages/show_venue.html',
+        detail=detail_fragment('venue', venue_id, etag, venue_page_data)))
+
+
+def venue_page_data(venue_id):
     # TODO: replace with real venue data from the venues table, using venue_id
-    found_venue = Venue.query.get(venue_id)
+    rows = db.session.query(
+        Venue,
+        Show,
+        Artist,
+        (Show.start_time < datetime.now()).label('is_past')).outerjoin(
+        Show,
+        Show.venue_id == Venue.id).outerjoin(
+        Artist,
+        Artist.id == Show.artist_id).filter(
+        Venue.id == venue_id).options(
+        selectinload(
+            Venue.genres)).order_by(
+        Show.start_time).all()
+    if not rows:
+        abort(404)
+    found_venue = rows[0].Venue
 
-    shows = Show.query.filter(
-        and_(
-            Show.start_time < datetime.now(),
-            Show.venue_id == venue_id))
     past_shows = []
-    for show in shows:
-        artist = Artist.query.get(show.artist_id)
-        show_data = {
-            "artist_id": artist.id,
-            "artist_name": artist.name,
-            "artist_image_link": artist.image_link,
-            "start_time": str(show.start_time),
-        }
-        past_shows.append(show_data)
-    shows = Show.query.filter(
-        and_(
-            Show.start_time >= datetime.now(),
-            Show.venue_id == venue_id))
     upcoming_shows = []
-    for show in shows:
-        artist = Artist.query.get(show.artist_id)
+    next_start = None
+    for _, show, artist, is_past in rows:
+        # no shows at all, or a show without a start time
+        if is_past is None:
+            continue
         show_data = {
             "artist_id": artist.id,
             "artist_name": artist.name,
             "artist_image_link": artist.image_link,
-            "start_time": str(show.start_time),
+            "start_time": show.start_time,
         }
-        upcoming_shows.append(show_data)
+        if is_past:
+            past_shows.append(show_data)
+        else:
+            next_start = next_start or show.start_time
+            upcoming_shows.append(show_data)
 
     data = {
         "id": found_venue.id,
         "name": found_venue.name,
-        "genres": found_venue.genres.split(','),
+        "genres": [genre.name for genre in found_venue.genres],
         "address": found_venue.address,
         "city": found_venue.city,
         "state": found_venue.state,
@@ -248,19 +980,19 @@ def show_venue(venue_id):
         "upcoming_shows_count": len(upcoming_shows),
     }
 
-    return render_template('pages/show_venue.html', venue=data)
+    return data, next_start
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues/create', methods=['GET'])
+@bp.route('/venues/create', methods=['GET'])
 def create_venue_form():
-    form = VenueForm()
+    form = forms.VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@bp.route('/venues/create', methods=['POST'])
 def create_venue_submission():
     # TODO: insert form data as a new Venue record in the db, instead
     # TODO: modify data to be the data object returned from db insertion
@@ -284,7 +1016,7 @@ def create_venue_submission():
             state=state,
             address=address,
             phone=phone,
-            genres=','.join(genres),
+            genres=genres_from_names(genres),
             facebook_link=facebook_link,
             image_link=image_link,
             website=website_link,
@@ -317,7 +1049,7 @@ def create_venue_submission():
     return render_template('pages/home.html')
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@bp.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
     # TODO: Complete this endpoint for taking a venue_id, and using
     # SQLAlchemy ORM to delete a record. Handle cases where the session commit
@@ -341,31 +1073,27 @@ def delete_venue(venue_id):
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists')
+@bp.route('/artists')
 def artists():
     # TODO: replace with real data returned from querying the database
-    artist = Artist.query.all()
+    artist = Artist.query
+    genre = request.args.get('genre')
+    if genre:
+        artist = artist.join(Artist.genres).filter(Genre.name == genre)
     data = [ar.identity() for ar in artist]
 
     return render_template('pages/artists.html', artists=data)
 
 
-@app.route('/artists/search', methods=['POST'])
+@bp.route('/artists/search', methods=['POST'])
 def search_artists():
     # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
 
     search_term = request.form.get('search_term', '')
-    search_word = Artist.query.filter(
-        Artist.name.ilike(
-            '%{}%'.format(search_term)))
-    list_id = [artist.id for artist in search_word]
-
-    response = {
-        "count": len(list_id),
-        "data": search_word
-    }
+    page = request.form.get('page', 1, type=int)
+    response = search_page(Artist, search_term, page)
     return render_template(
         'pages/search_artists.html',
         results=response,
@@ -374,45 +1102,63 @@ def search_artists():
             ''))
 
 
-@app.route('/artists/<int:artist_id>')
+@bp.route('/artists/search.json')
+def search_artists_json():
+    # id/name matches for the search box's autocomplete
+    return typeahead(Artist)
+
+
+@bp.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
     # shows the artist page with the given artist_id
+    return conditional_page('artist', artist_id, lambda etag: render_template(
+        'pages/show_artist.html',
+        detail=detail_fragment('artist', artist_id, etag, artist_page_data)))
+
+
+def artist_page_data(artist_id):
     # TODO: replace with real artist data from the artist table, using
     # artist_id
-    artist = Artist.query.get(artist_id)
-    shows = Show.query.filter(
-        and_(
-            Show.start_time < datetime.now(),
-            Show.artist_id == artist_id))
+    rows = db.session.query(
+        Artist,
+        Show,
+        Venue,
+        (Show.start_time < datetime.now()).label('is_past')).outerjoin(
+        Show,
+        Show.artist_id == Artist.id).outerjoin(
+        Venue,
+        Venue.id == Show.venue_id).filter(
+        Artist.id == artist_id).options(
+        selectinload(
+            Artist.genres)).order_by(
+        Show.start_time).all()
+    if not rows:
+        abort(404)
+    artist = rows[0].Artist
+
     past_shows = []
-    for show in shows:
-        venue = Venue.query.get(show.venue_id)
-        show_data = {
-            "venue_id": venue.id,
-            "venue_name": venue.name,
-            "venue_image_link": venue.image_link,
-            "start_time": str(show.start_time),
-        }
-        past_shows.append(show_data)
-    shows = Show.query.filter(
-        and_(
-            Show.start_time >= datetime.now(),
-            Show.artist_id == artist_id))
     upcoming_shows = []
-    for show in shows:
-        venue = Venue.query.get(show.venue_id)
+    next_start = None
+    for _, show, venue, is_past in rows:
+        # no shows at all, or a show without a start time
+        if is_past is None:
+            continue
         show_data = {
             "venue_id": venue.id,
             "venue_name": venue.name,
             "venue_image_link": venue.image_link,
-            "start_time": str(show.start_time),
+            "start_time": show.start_time,
         }
-        upcoming_shows.append(show_data)
+        if is_past:
+            past_shows.append(show_data)
+        else:
+            next_start = next_start or show.start_time
+            upcoming_shows.append(show_data)
 
     data = {
         "id": artist.id,
         "name": artist.name,
-        "genres": artist.genres.split(','),
+        "genres": [genre.name for genre in artist.genres],
         "city": artist.city,
         "state": artist.state,
         "phone": artist.phone,
@@ -426,20 +1172,20 @@ def show_artist(artist_id):
         "upcoming_shows": upcoming_shows,
         "upcoming_shows_count": len(upcoming_shows),
     }
-    return render_template('pages/show_artist.html', artist=data)
+    return data, next_start
 
 #  Update
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
-    form = ArtistForm()
+    form = forms.ArtistForm()
     searched_artist = Artist.query.get(artist_id)
     data = {
         "id": searched_artist.id,
         "name": searched_artist.name,
-        "genres": searched_artist.genres.split(','),
+        "genres": [genre.name for genre in searched_artist.genres],
         "city": searched_artist.city,
         "state": searched_artist.state,
         "phone": searched_artist.phone,
@@ -454,7 +1200,7 @@ def edit_artist(artist_id):
     return render_template('forms/edit_artist.html', form=form, artist=data)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     # TODO: take values from the form submitted, and update existing
     # artist record with ID <artist_id> using the new attributes
@@ -476,7 +1222,7 @@ def edit_artist_submission(artist_id):
         artist_updated.city = city
         artist_updated.state = state
         artist_updated.phone = phone
-        artist_updated.genres = ','.join(genres)
+        artist_updated.genres = genres_from_names(genres)
         artist_updated.facebook_link = facebook_link
         artist_updated.website = website
         artist_updated.image_link = image_link
@@ -498,18 +1244,18 @@ def edit_artist_submission(artist_id):
     finally:
         db.session.close()
 
-    return redirect(url_for('show_artist', artist_id=artist_id))
+    return redirect(url_for('.show_artist', artist_id=artist_id))
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
-    form = VenueForm()
+    form = forms.VenueForm()
     found_venue = Venue.query.get(venue_id)
 
     data = {
         "id": found_venue.id,
         "name": found_venue.name,
-        "genres": found_venue.genres.split(','),
+        "genres": [genre.name for genre in found_venue.genres],
         "address": found_venue.address,
         "city": found_venue.city,
         "state": found_venue.state,
@@ -525,7 +1271,7 @@ def edit_venue(venue_id):
     return render_template('forms/edit_venue.html', form=form, venue=data)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     # TODO: take values from the form submitted, and update existing
     # venue record with ID <venue_id> using the new attributes
@@ -549,7 +1295,7 @@ def edit_venue_submission(venue_id):
         venue.state = state
         venue.address = address
         venue.phone = phone
-        venue.genres = ','.join(genres)
+        venue.genres = genres_from_names(genres)
         venue.facebook_link = facebook_link
         venue.image_link = image_link
         venue.website_link = website_link
@@ -572,19 +1318,19 @@ def edit_venue_submission(venue_id):
     finally:
         db.session.close()
 
-    return redirect(url_for('show_venue', venue_id=venue_id))
+    return redirect(url_for('.show_venue', venue_id=venue_id))
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/create', methods=['GET'])
+@bp.route('/artists/create', methods=['GET'])
 def create_artist_form():
-    form = ArtistForm()
+    form = forms.ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@bp.route('/artists/create', methods=['POST'])
 def create_artist_submission():
     # called upon submitting the new artist listing form
     # TODO: insert form data as a new Venue record in the db, instead
@@ -607,7 +1353,7 @@ def create_artist_submission():
             city=city,
             state=state,
             phone=phone,
-            genres=','.join(genres),
+            genres=genres_from_names(genres),
             facebook_link=facebook_link,
             website=website,
             image_link=image_link,
@@ -639,60 +1385,102 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@bp.route('/shows')
 def shows():
-    # displays list of shows at /shows
-    # TODO: replace with real venues data.
-    showing_data = Show.query.all()
-    all_data = []
+    # displays list of shows at /shows, one page at a time.
+    # Pages are keyed on (start_time, id) of the last show of the previous
+    # page, so the cost of a page does not depend on how deep it is.
+    per_page = min(
+        request.args.get('per_page', current_app.config['SHOWS_PER_PAGE'], type=int),
+        current_app.config['SHOWS_MAX_PER_PAGE'])
+    if per_page < 1:
+        abort(400)
+
+    query = db.session.query(
+        Show.id,
+        Show.start_time,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')).join(
+        Venue,
+        Venue.id == Show.venue_id).join(
+        Artist,
+        Artist.id == Show.artist_id).filter(
+        Show.start_time.isnot(None))
+
+    cursor = request.args.get('after')
+    if cursor:
+        try:
+            after_time, after_id = cursor.rsplit('_', 1)
+            after_time = datetime.fromisoformat(after_time)
+            after_id = int(after_id)
+        except ValueError:
+            abort(400)
+        query = query.filter(
+            or_(
+                Show.start_time > after_time,
+                and_(
+                    Show.start_time == after_time,
+                    Show.id > after_id)))
+
+    # one extra row tells us whether there is a next page
+    showing_data = query.order_by(
+        Show.start_time,
+        Show.id).limit(
+        per_page + 1).all()
+    next_cursor = None
+    if len(showing_data) > per_page:
+        showing_data = showing_data[:per_page]
+        last = showing_data[-1]
+        next_cursor = '{}_{}'.format(last.start_time.isoformat(), last.id)
 
+    all_data = []
     for shows in showing_data:
-        venue_id = shows.venue_id
-        artist_id = shows.artist_id
-        venue = Venue.query.get(venue_id)
-        artist = Artist.query.get(artist_id)
-
         shows_data = {
-            "venue_id": venue_id,
-            "venue_name": venue.name,
-            "artist_id": artist_id,
-            "artist_name": artist.name,
-            "artist_image_link": artist.image_link,
-            "start_time": str(shows.start_time)
+            "venue_id": shows.venue_id,
+            "venue_name": shows.venue_name,
+            "artist_id": shows.artist_id,
+            "artist_name": shows.artist_name,
+            "artist_image_link": shows.artist_image_link,
+            "start_time": shows.start_time
         }
 
         all_data.append(shows_data)
 
-    return render_template('pages/shows.html', shows=all_data)
+    return render_template(
+        'pages/shows.html',
+        shows=all_data,
+        next_cursor=next_cursor,
+        per_page=per_page)
 
 
-@app.route('/shows/create')
+@bp.route('/shows/create')
 def create_shows():
     # renders form. do not touch.
-    form = ShowForm()
+    form = forms.ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+@bp.route('/shows/create', methods=['POST'])
 def create_show_submission():
     # called to create new shows in the db, upon submitting new show listing form
     # TODO: insert form data as a new Show record in the db, instead
-    venue_id = request.form.get('venue_id')
-    artist_id = request.form.get('artist_id')
-    start_time = request.form.get('start_time')
+    booking = {
+        'venue_id': request.form.get('venue_id'),
+        'artist_id': request.form.get('artist_id'),
+        'start_time': request.form.get('start_time'),
+        'duration': request.form.get('duration'),
+    }
 
     try:
-        ven = Venue(id=venue_id)
-        s = Show(start_time=start_time)
-        s.artist = Artist(id=artist_id)
-        ven.show.append(s)
-
-        db.session.add(ven)
-        db.session.commit()
+        book_shows([booking])
         flash('Show was successfully listed!')
-
-    except BaseException:
-        db.session.rollback()
+    except BookingError as error:
+        flash('Show could not be listed: {}.'.format(
+            ', '.join(message for _, message in error.errors)))
+    except exc.SQLAlchemyError:
         print(sys.exc_info())
         flash('An error occurred. Show could not be listed.')
     finally:
@@ -706,24 +1494,1016 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+# ----------------------------------------------------------------------------#
+# Bulk import.
+# ----------------------------------------------------------------------------#
+
+# `flask import venues|artists|shows FILE` loads a promoter's catalog in
+# batches. Every row is validated first and rejected rows are reported with
+# their line number; the rest of the batch is still inserted. Shows name
+# their venue and artist either by id or by name.
+
+ENTITY_FIELDS = {
+    'venues': (Venue, 'seeking_talent', (
+        'name', 'city', 'state', 'address', 'phone', 'image_link',
+        'facebook_link', 'website', 'seeking_description')),
+    'artists': (Artist, 'seeking_venue', (
+        'name', 'city', 'state', 'phone', 'image_link',
+        'facebook_link', 'website', 'seeking_description')),
+}
+
+
+def read_records(path):
+    """Yield (line, record) pairs from a CSV, JSON lines or JSON file.
+
+    A record that cannot be read comes as a ValueError saying why, for the
+    caller to report; after one the rest of a CSV or JSON array file is
+    unreadable, so nothing more is yielded.
+    """
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            try:
+                for record in reader:
+                    yield reader.line_num, record
+            except (csv.Error, UnicodeDecodeError) as error:
+                yield reader.line_num + 1, ValueError(
+                    'unreadable CSV, import stopped: {}'.format(error))
+    elif path.endswith(('.jsonl', '.ndjson')):
+        with open(path, 'rb') as f:
+            for line, text in enumerate(f, 1):
+                if not text.strip():
+                    continue
+                try:
+                    yield line, json.loads(text.decode('utf-8'))
+                except ValueError as error:
+                    yield line, ValueError('invalid JSON: {}'.format(error))
+    else:
+        with open(path, encoding='utf-8') as f:
+            try:
+                yield from read_json_array(f)
+            except (ValueError, UnicodeDecodeError) as error:
+                yield getattr(error, 'line', None), ValueError(
+                    'invalid JSON, import stopped: {}'.format(error))
+
+
+# Longest a single record of a JSON array file may be. Arrays are read a
+# record at a time, so this, not the file size, bounds the memory used.
+JSON_MAX_RECORD = 1 << 20
+
+
+def read_json_array(f, chunk_size=1 << 16):
+    """Yield (line, record) for each element of the JSON array in file f,
+    reading it a chunk at a time rather than loading it whole."""
+    decoder = json.JSONDecoder()
+    buffer, line, eof = '', 1, False
+    state = 'start'
+
+    def fail(message):
+        error = ValueError(message)
+        error.line = line
+        return error
+
+    while True:
+        stripped = buffer.lstrip()
+        line += buffer.count('\n', 0, len(buffer) - len(stripped))
+        buffer = stripped
+        if not buffer:
+            if eof:
+                if state != 'done':
+                    raise fail('unexpected end of file')
+                return
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = chunk
+            continue
+
+        if state == 'start':
+            if buffer[0] != '[':
+                raise fail('expected a JSON array (or use a .jsonl file, '
+                           'one record per line)')
+            buffer, state = buffer[1:], 'first'
+        elif state == 'first' and buffer[0] == ']':
+            buffer, state = buffer[1:], 'done'
+        elif state in ('first', 'value'):
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except ValueError as error:
+                record, end = error, None
+            if (end is None or end == len(buffer)) and not eof:
+                # the record may go on in the next chunk
+                if len(buffer) > JSON_MAX_RECORD:
+                    raise fail('record longer than {} bytes'.format(
+                        JSON_MAX_RECORD))
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            if end is None:
+                line += record.lineno - 1
+                raise fail(record.msg)
+            yield line, record
+            line += buffer.count('\n', 0, end)
+            buffer, state = buffer[end:], 'next'
+        elif state == 'next' and buffer[0] in ',]':
+            buffer, state = buffer[1:], (
+                'value' if buffer[0] == ',' else 'done')
+        elif state == 'done':
+            raise fail('extra data after the array')
+        else:
+            raise fail("expected ',' or ']'")
+
+
+def clean_entity(kind, record):
+    model, seeking, fields = ENTITY_FIELDS[kind]
+    values = {field: (record.get(field) or None) for field in fields}
+    if not values['name']:
+        raise ValueError('name is required')
+    seeking_value = record.get(seeking)
+    if not isinstance(seeking_value, bool):
+        seeking_value = str(seeking_value or '').strip().lower() in (
+            '1', 'true', 'yes', 'y')
+    values[seeking] = seeking_value
+    genres = record.get('genres') or []
+    if isinstance(genres, str):
+        genres = genres.split(',')
+    values['genres'] = [name.strip() for name in genres
+                        if name and name.strip()]
+    return values
+
+
+def clean_show(record):
+    try:
+        values = {'start_time': dateutil_parser.parse(
+            str(record.get('start_time') or ''))}
+    except (ValueError, OverflowError):
+        raise ValueError('start_time is not a valid date')
+    duration = record.get('duration')
+    try:
+        duration = int(duration) if duration not in (None, '') \
+            else DEFAULT_SHOW_DURATION
+    except (TypeError, ValueError):
+        raise ValueError('duration is not a number')
+    if not 0 < duration <= MAX_SHOW_DURATION:
+        raise ValueError('duration must be 1 to {} minutes'.format(
+            MAX_SHOW_DURATION))
+    values['duration'] = duration
+    values['end_time'] = values['start_time'] + timedelta(minutes=duration)
+    for ref in ('venue', 'artist'):
+        ref_id = record.get(ref + '_id')
+        ref_name = record.get(ref + '_name')
+        if ref_id not in (None, ''):
+            try:
+                values[ref + '_id'] = int(ref_id)
+            except (TypeError, ValueError):
+                raise ValueError('{}_id is not a number'.format(ref))
+        elif ref_name:
+            values[ref + '_name'] = ref_name.strip()
+        else:
+            raise ValueError('{0}_id or {0}_name is required'.format(ref))
+    return values
+
+
+def resolve_show_refs(rows, report):
+    """Replace venue/artist names with ids, dropping unresolvable rows."""
+    for ref, model in (('venue', Venue), ('artist', Artist)):
+        key, name_key = ref + '_id', ref + '_name'
+        names = {values[name_key] for _, values in rows if name_key in values}
+        by_name = {}
+        if names:
+            for name, ref_id in db.session.query(
+                    model.name, model.id).filter(model.name.in_(names)):
+                by_name.setdefault(name, []).append(ref_id)
+        ids = {values[key] for _, values in rows if key in values}
+        known = set()
+        if ids:
+            known = {ref_id for ref_id, in db.session.query(
+                model.id).filter(model.id.in_(ids))}
+
+        resolved = []
+        for line, values in rows:
+            if name_key in values:
+                name = values.pop(name_key)
+                matches = by_name.get(name, [])
+                if len(matches) != 1:
+                    report(line, '{} {} {!r}'.format(
+                        'ambiguous' if matches else 'unknown', ref, name))
+                    continue
+                values[key] = matches[0]
+            elif values[key] not in known:
+                report(line, 'unknown {} id {}'.format(ref, values[key]))
+                continue
+            resolved.append((line, values))
+        rows = resolved
+    return rows
+
+
+def insert_entities(kind, rows):
+    model = ENTITY_FIELDS[kind][0]
+    genres = {genre.name: genre for genre in genres_from_names(
+        name for values in rows for name in values['genres'])}
+    # the unit of work batches these into multi-row INSERTs, and the genre
+    # links into a single executemany
+    db.session.add_all([
+        model(**dict(values, genres=[genres[name]
+                                     for name in values['genres']]))
+        for values in rows])
+    db.session.flush()
+
+
+def insert_shows(rows):
+    # a Core executemany skips the per-row counter listeners; the counters
+    # are refreshed once per batch instead
+    db.session.execute(Show.__table__.insert(), rows)
+    # nor is there a flush for session_wrote to see
+    db.session.info['wrote'] = True
+    connection = db.session.connection()
+    touch(connection, Venue, {values['venue_id'] for values in rows})
+    touch(connection, Artist, {values['artist_id'] for values in rows})
+    refresh_upcoming_counts({values['venue_id'] for values in rows})
+
+
+def insert_rows(kind, rows, report):
+    """Insert rows in one go, or one by one when the batch is rejected."""
+    if not rows:
+        return 0
+    if kind == 'shows':
+        insert = insert_shows
+    else:
+        insert = functools.partial(insert_entities, kind)
+
+    try:
+        insert([values for _, values in rows])
+        db.session.commit()
+        return len(rows)
+    except exc.SQLAlchemyError:
+        db.session.rollback()
+
+    inserted = 0
+    for line, values in rows:
+        try:
+            insert([values])
+            db.session.commit()
+            inserted += 1
+        except exc.SQLAlchemyError as error:
+            db.session.rollback()
+            report(line, str(getattr(error, 'orig', None)
+                             or error).splitlines()[0])
+    return inserted
+
+
+def import_records(kind, records, batch_size, report):
+    """Import (line, record) pairs; returns the number of rows inserted."""
+    if kind == 'shows':
+        clean = clean_show
+    else:
+        clean = functools.partial(clean_entity, kind)
+    records = iter(records)
+    inserted = 0
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if not batch:
+            return inserted
+        rows = []
+        for line, record in batch:
+            if isinstance(record, ValueError):
+                report(line, str(record))
+                continue
+            if not isinstance(record, dict):
+                report(line, 'not a JSON object')
+                continue
+            try:
+                rows.append((line, clean(record)))
+            except ValueError as error:
+                report(line, str(error))
+        if kind == 'shows':
+            rows = resolve_show_refs(rows, report)
+            conflicts = dict(show_conflicts(rows))
+            for line, message in conflicts.items():
+                report(line, message)
+            rows = [(line, values) for line, values in rows
+                    if line not in conflicts]
+        inserted += insert_rows(kind, rows, report)
+
+
+@bp.cli.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Rows inserted per transaction.')
+def import_command(kind, path, batch_size):
+    """Bulk load venues, artists or shows from a CSV or JSON file.
+
+    JSON may be one array (.json) or one record per line (.jsonl), which
+    keeps going past a malformed line where an array has to stop.
+    """
+    rejected = 0
+
+    def report(line, message):
+        nonlocal rejected
+        rejected += 1
+        click.echo('{}:{}: {}'.format(path, line, message), err=True)
+
+    inserted = import_records(kind, read_records(path), batch_size, report)
+    click.echo('{} {} imported, {} rows rejected'.format(
+        inserted, kind, rejected))
+
+# ----------------------------------------------------------------------------#
+# Show booking.
+# ----------------------------------------------------------------------------#
+
+# Shows are booked from the /shows/create form and, a whole tour at a time,
+# by POST /api/v1/shows. A batch is booked in one transaction or not at all.
+
+
+class BookingError(ValueError):
+    """Bookings that were refused; `errors` lists (position, message)."""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(
+            '#{}: {}'.format(index, message) for index, message in errors))
+        self.errors = errors
+
+
+def existing_show_refs(rows):
+    """Ids of the venues and artists referenced by rows that exist.
+
+    Both tables are checked in a single query.
+    """
+    venue_ids = {values['venue_id'] for values in rows}
+    artist_ids = {values['artist_id'] for values in rows}
+    found = {'venue': set(), 'artist': set()}
+    query = select(literal('venue'), Venue.id).where(
+        Venue.id.in_(venue_ids)).union_all(
+        select(literal('artist'), Artist.id).where(
+            Artist.id.in_(artist_ids)))
+    for ref, ref_id in db.session.execute(query):
+        found[ref].add(ref_id)
+    return found
+
+
+# Rows checked per query by show_conflicts. Each adds two ORed range scans,
+# and SQLite refuses expressions nested more than 1000 deep.
+CONFLICT_CHECK_ROWS = 100
+
+
+def show_conflicts(rows):
+    """(key, message) for each of the (key, values) rows that would overlap
+    another show at its venue or by its artist.
+
+    Existing shows are found with range scans on the (venue_id, start_time)
+    and (artist_id, start_time) indexes, one query per CONFLICT_CHECK_ROWS
+    rows. A show lasts at most MAX_SHOW_DURATION, so only shows starting
+    within that long before a new one can overlap it, however long the
+    venue's history is. Rows are also checked against the rows before them.
+    """
+    if not rows:
+        return []
+    longest = timedelta(minutes=MAX_SHOW_DURATION)
+    existing = {}
+    for start in range(0, len(rows), CONFLICT_CHECK_ROWS):
+        for show in db.session.query(
+                Show.id,
+                Show.venue_id,
+                Show.artist_id,
+                Show.start_time,
+                Show.end_time).filter(
+                or_(*[and_(
+                    column == values[column.key],
+                    Show.start_time > values['start_time'] - longest,
+                    Show.start_time < values['end_time'],
+                    Show.end_time > values['start_time'])
+                    for _, values in rows[start:start + CONFLICT_CHECK_ROWS]
+                    for column in (Show.venue_id, Show.artist_id)])):
+            existing[show.id] = show
+
+    def span(show):
+        return (as_utc(show['start_time'], naive_is_utc=False),
+                as_utc(show['end_time'], naive_is_utc=False))
+
+    booked = [('show {}'.format(show.id), show._asdict())
+              for show in existing.values()]
+    booked = [(name, show, span(show)) for name, show in booked]
+    conflicts = []
+    for key, values in rows:
+        start, end = span(values)
+        message = next((
+            '{} {} is already booked at that time ({})'.format(
+                ref, values[ref + '_id'], name)
+            for name, other, (other_start, other_end) in booked
+            if other_start < end and start < other_end
+            for ref in ('venue', 'artist')
+            if other[ref + '_id'] == values[ref + '_id']), None)
+        if message:
+            conflicts.append((key, message))
+        else:
+            booked.append(('#{}'.format(key), values, (start, end)))
+    return conflicts
+
+
+def book_shows(bookings):
+    """Insert shows given as dicts of venue_id, artist_id, start_time and
+    optionally duration (minutes).
+
+    Raises BookingError, without inserting anything, if any booking is
+    invalid, names a venue or artist that does not exist, or overlaps
+    another show of its venue or artist.
+    """
+    errors, rows = [], []
+    for index, booking in enumerate(bookings):
+        try:
+            if not isinstance(booking, dict):
+                raise ValueError('not an object')
+            for ref in ('venue', 'artist'):
+                # unlike imports, bookings do not look names up
+                if booking.get(ref + '_id') in (None, ''):
+                    raise ValueError('{}_id is required'.format(ref))
+            values = clean_show(booking)
+        except ValueError as error:
+            errors.append((index, str(error)))
+        else:
+            rows.append((index, values))
+    if not rows and not errors:
+        errors.append((0, 'no shows to book'))
+
+    if rows:
+        found = existing_show_refs([values for _, values in rows])
+        for index, values in rows:
+            for ref in ('venue', 'artist'):
+                if values[ref + '_id'] not in found[ref]:
+                    errors.append((index, 'unknown {} id {}'.format(
+                        ref, values[ref + '_id'])))
+        errors.extend(show_conflicts(rows))
+    if errors:
+        raise BookingError(sorted(errors))
+
+    rows = [values for _, values in rows]
+    try:
+        insert_shows(rows)
+        db.session.commit()
+    except exc.IntegrityError as error:
+        db.session.rollback()
+        # the exclusion constraints catch overlapping bookings made at the
+        # same time on Postgres
+        if getattr(error.orig, 'pgcode', None) != '23P01':
+            raise
+        raise BookingError([(0, 'another show was just booked at the '
+                                'same time')])
+    except exc.SQLAlchemyError:
+        db.session.rollback()
+        raise
+    return len(rows)
+
+# ----------------------------------------------------------------------------#
+# Bulk export.
+# ----------------------------------------------------------------------------#
+
+# Exports are generated row by row from a server-side cursor, so memory use
+# stays flat however large the catalog is and the first bytes go out right
+# away. The formats are the ones `flask import` reads back.
+
+SHOW_EXPORT_FIELDS = ('id', 'venue_id', 'venue_name', 'artist_id',
+                      'artist_name', 'start_time', 'duration')
+
+
+def export_shows_csv():
+    rows = db.session.query(
+        Show.id,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Show.start_time,
+        Show.duration).join(
+        Venue,
+        Venue.id == Show.venue_id).join(
+        Artist,
+        Artist.id == Show.artist_id).order_by(
+        Show.id).yield_per(
+        current_app.config['EXPORT_BATCH_SIZE'])
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(SHOW_EXPORT_FIELDS)
+    for row in rows:
+        writer.writerow([
+            row.id,
+            row.venue_id,
+            row.venue_name,
+            row.artist_id,
+            row.artist_name,
+            row.start_time.isoformat() if row.start_time else '',
+            row.duration])
+        if buffer.tell() > 8192:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_venues_ndjson():
+    venues = Venue.query.options(
+        selectinload(
+            Venue.genres)).order_by(
+        Venue.id).yield_per(
+        current_app.config['EXPORT_BATCH_SIZE'])
+    for venue in venues:
+        yield json.dumps({
+            "id": venue.id,
+            "name": venue.name,
+            "city": venue.city,
+            "state": venue.state,
+            "address": venue.address,
+            "phone": venue.phone,
+            "genres": [genre.name for genre in venue.genres],
+            "image_link": venue.image_link,
+            "facebook_link": venue.facebook_link,
+            "website": venue.website,
+            "seeking_talent": venue.seeking_talent,
+            "seeking_description": venue.seeking_description,
+            "num_upcoming_shows": venue.num_upcoming_shows or 0
+        }) + '\n'
+
+
+@bp.route('/export/shows.csv')
+def export_shows():
+    return Response(
+        stream_with_context(export_shows_csv()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=shows.csv'})
+
+
+@bp.route('/export/venues.ndjson')
+def export_venues():
+    return Response(
+        stream_with_context(export_venues_ndjson()),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': 'attachment; filename=venues.ndjson'})
+
+
+@bp.cli.command('export')
+@click.argument('kind', type=click.Choice(['shows', 'venues']))
+@click.argument('output', type=click.File('w', encoding='utf-8'),
+                default='-')
+def export_command(kind, output):
+    """Write all shows as CSV or all venues as NDJSON."""
+    generate = export_shows_csv if kind == 'shows' else export_venues_ndjson
+    for chunk in generate():
+        output.write(chunk)
+
+# ----------------------------------------------------------------------------#
+# Scheduled jobs.
+# ----------------------------------------------------------------------------#
+
+# Periodic work: moving shows that have started from upcoming to past,
+# reconciling the counters, and warming the page cache. Jobs run in a
+# `flask jobs run` process or, with JOBS_IN_PROCESS, in a thread of each web
+# worker. On Postgres every job has an advisory lock, and only the process
+# holding it runs the job; the lock is kept until that process exits or
+# loses its connection, and another one takes the job over then. Elsewhere,
+# run a single job process.
+# The locks are session locks: behind pgbouncer in transaction pooling mode,
+# set JOB_LOCK_DATABASE_URL to Postgres itself or to a session-mode pool.
+
+JOBS = {}
+
+
+def job(name):
+    """Register a job, run every JOB_INTERVALS[name] seconds."""
+    def register(function):
+        JOBS[name] = function
+        return function
+    return register
+
+
+@job('roll-shows')
+def roll_shows(interval):
+    """Move shows that have started from upcoming to past."""
+    # look back over two intervals, so a late run does not miss any
+    count = advance_upcoming_counts(timedelta(seconds=2 * interval))
+    db.session.commit()
+    return count
+
+
+@job('refresh-aggregates')
+def refresh_aggregates(interval):
+    """Reconcile every venue's upcoming show count with the Show table."""
+    count = refresh_upcoming_counts()
+    db.session.commit()
+    return count
+
+
+@job('warm-caches')
+def warm_caches(interval):
+    """Render the pages of the busiest venues and artists into the cache.
+
+    Only useful with a cache the web workers share (CACHE_TYPE='redis').
+    """
+    limit = current_app.config['JOB_WARM_PAGES']
+    venue_ids = db.session.query(Venue.id).order_by(
+        Venue.num_upcoming_shows.desc(),
+        Venue.id).limit(limit).all()
+    artist_ids = db.session.query(Show.artist_id).filter(
+        Show.start_time >= datetime.now()).group_by(
+        Show.artist_id).order_by(
+        func.count(Show.id).desc(),
+        Show.artist_id).limit(limit).all()
+    warmed = 0
+    for kind, ids, load in (('venue', venue_ids, venue_page_data),
+                            ('artist', artist_ids, artist_page_data)):
+        for entity_id, in ids:
+            validators = page_validators(kind, entity_id)
+            if validators is not None:
+                detail_fragment(kind, entity_id, validators[0], load)
+                warmed += 1
+    return warmed
+
+
+class JobRunner:
+    """Runs the jobs whose lock this process holds, when they are due."""
+
+    def __init__(self, app, names=None):
+        self.app = app
+        self.names = list(names or JOBS)
+        self.next_run = {}
+        self.results = {}
+        self.held = set()
+        # the locks belong to this connection, opened for good, outside the
+        # pool, and in autocommit mode so it never sits idle in a transaction
+        self.connection = None
+        self.pid = None
+        self.lock_engine = None
+
+    def acquire(self, name):
+        if db.engine.dialect.name != 'postgresql':
+            return True
+        if self.held:
+            try:
+                # a Connection quietly reconnects after an error, to a new
+                # session that holds none of our locks
+                alive = self.connection.execute(
+                    select(func.pg_backend_pid())).scalar() == self.pid
+            except exc.DBAPIError:
+                alive = False
+            if not alive:
+                self.release()
+        if name in self.held:
+            return True
+        try:
+            if self.connection is None:
+                if self.lock_engine is None:
+                    self.lock_engine = create_engine(
+                        self.app.config['JOB_LOCK_DATABASE_URL']
+                        or self.app.config['SQLALCHEMY_DATABASE_URI'],
+                        poolclass=NullPool, isolation_level='AUTOCOMMIT')
+                self.connection = self.lock_engine.connect()
+                self.pid = self.connection.execute(
+                    select(func.pg_backend_pid())).scalar()
+            key = zlib.crc32('fyyur-job:{}'.format(name).encode('utf-8'))
+            if self.connection.execute(
+                    select(func.pg_try_advisory_lock(key))).scalar():
+                self.held.add(name)
+                return True
+            return False
+        except exc.DBAPIError:
+            # no telling which locks the session still has, if any
+            self.release()
+            raise
+
+    def release(self):
+        self.held.clear()
+        if self.connection is not None:
+            if not self.connection.invalidated:
+                try:
+                    # now, rather than when the server notices the close
+                    self.connection.execute(
+                        select(func.pg_advisory_unlock_all()))
+                except exc.DBAPIError:
+                    pass
+            # closing the connection ends the session, and its locks with it
+            self.connection.invalidate()
+            self.connection.close()
+            self.connection = None
+
+    def run_pending(self):
+        """Run the due jobs; returns seconds until the next one is due."""
+        now = time.time()
+        for name in self.names:
+            if self.next_run.get(name, 0) > now:
+                continue
+            interval = self.app.config['JOB_INTERVALS'][name]
+            self.next_run[name] = now + interval
+            with self.app.app_context():
+                try:
+                    if not self.acquire(name):
+                        self.results[name] = 'run by another process'
+                        continue
+                    self.results[name] = JOBS[name](interval)
+                    self.app.logger.info(
+                        'job %s: %s', name, self.results[name])
+                except Exception as error:
+                    db.session.rollback()
+                    self.results[name] = 'failed: {}'.format(error)
+                    self.app.logger.exception('job %s failed', name)
+        return max(min(self.next_run.values()) - time.time(), 0)
+
+    def run_forever(self, stop=None):
+        stop = stop or threading.Event()
+        try:
+            while not stop.wait(self.run_pending()):
+                pass
+        finally:
+            with self.app.app_context():
+                self.release()
+
+
+def start_job_thread():
+    # started by the first request of each worker process, so it survives
+    # gunicorn forking workers from a preloaded app
+    app = current_app._get_current_object()
+    runner = app.extensions.get('job_runner')
+    if runner is None or runner[0] != os.getpid():
+        thread = threading.Thread(
+            target=JobRunner(app).run_forever, name='fyyur-jobs', daemon=True)
+        app.extensions['job_runner'] = (os.getpid(), thread)
+        thread.start()
+
+
+@bp.cli.group('jobs')
+def jobs_command():
+    """Run the periodic jobs."""
+
+
+@jobs_command.command('run')
+@click.argument('names', nargs=-1, type=click.Choice(sorted(JOBS)))
+@click.option('--once', is_flag=True,
+              help='Run the jobs (that this process may run) once and exit.')
+def run_jobs_command(names, once):
+    """Run the jobs, or only NAMES, on their schedule."""
+    runner = JobRunner(current_app._get_current_object(), names)
+    if once:
+        try:
+            runner.run_pending()
+        finally:
+            runner.release()
+        for name, result in sorted(runner.results.items()):
+            click.echo('{}: {}'.format(name, result))
+        return
+    runner.run_forever()
+
+
+@jobs_command.command('list')
+def list_jobs_command():
+    """List the jobs and how often they run."""
+    for name, function in sorted(JOBS.items()):
+        click.echo('{:<20}every {:>5}s  {}'.format(
+            name, current_app.config['JOB_INTERVALS'][name],
+            function.__doc__.splitlines()[0]))
+
+# ----------------------------------------------------------------------------#
+# API.
+# ----------------------------------------------------------------------------#
+# /api/v1/<kind> and /api/v1/<kind>/<id> serve venues, artists and shows as
+# JSON. `fields=name,city` (or `fields[venues]=...`, which also applies to
+# included resources) limits the fields returned, and only those columns are
+# selected; `id` is always sent. `include=shows` on venues and artists, and
+# `include=venue,artist` on shows, add the related records, loaded with one
+# more query per include. Lists are paged on id with `after=` and
+# `per_page=`; the shows list can be filtered with `venue_id=` and
+# `artist_id=`. A record includes at most API_MAX_INCLUDED shows, and links
+# to the rest with `shows_next`.
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+API_MODELS = {'venues': Venue, 'artists': Artist, 'shows': Show}
+
+API_FIELDS = {
+    'venues': ('id', 'name', 'city', 'state', 'address', 'phone', 'genres',
+               'image_link', 'facebook_link', 'website', 'seeking_talent',
+               'seeking_description', 'num_upcoming_shows', 'updated_at'),
+    'artists': ('id', 'name', 'city', 'state', 'phone', 'genres',
+                'image_link', 'facebook_link', 'website', 'seeking_venue',
+                'seeking_description', 'updated_at'),
+    'shows': ('id', 'venue_id', 'artist_id', 'start_time', 'duration',
+              'end_time', 'updated_at'),
+}
+
+# association table column holding the owner's id, for the genres field
+API_GENRE_OWNERS = {
+    'venues': venue_genres.c.venue_id,
+    'artists': artist_genres.c.artist_id,
+}
+
+# columns the lists can be filtered on, e.g. /api/v1/shows?venue_id=1
+API_FILTERS = {
+    'venues': (),
+    'artists': (),
+    'shows': ('venue_id', 'artist_id'),
+}
+
+# include name -> (kind of the related records, foreign key joining them)
+API_INCLUDES = {
+    'venues': {'shows': ('shows', Show.__table__.c.venue_id)},
+    'artists': {'shows': ('shows', Show.__table__.c.artist_id)},
+    'shows': {'venue': ('venues', Show.__table__.c.venue_id),
+              'artist': ('artists', Show.__table__.c.artist_id)},
+}
+
+
+def api_fields(kind, primary=False):
+    value = request.args.get('fields[{}]'.format(kind))
+    if value is None and primary:
+        value = request.args.get('fields')
+    if value is None:
+        return API_FIELDS[kind]
+    fields = [field for field in value.split(',') if field]
+    unknown = set(fields) - set(API_FIELDS[kind])
+    if unknown:
+        abort(400, 'Unknown {} fields: {}'.format(
+            kind, ', '.join(sorted(unknown))))
+    return ['id'] + [field for field in dict.fromkeys(fields) if field != 'id']
+
+
+def api_includes(kind):
+    names = [name for name in request.args.get('include', '').split(',')
+             if name]
+    unknown = set(names) - set(API_INCLUDES[kind])
+    if unknown:
+        abort(400, 'Cannot include {} on {}'.format(
+            ', '.join(sorted(unknown)), kind))
+    return list(dict.fromkeys(names))
+
+
+def api_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def api_load(kind, fields, criteria, keys=(), after=None, limit=None,
+             per=None):
+    """Rows of `kind` and their records, selecting only what is needed.
+
+    The rows hold the requested columns plus `keys` (foreign keys used to
+    attach included records); the records hold the requested fields only.
+    With per=(key, n), at most n rows are loaded for each value of that key.
+    """
+    table = API_MODELS[kind].__table__
+    names = [name for name in dict.fromkeys(['id', *fields, *keys])
+             if name != 'genres']
+    if per is None:
+        source = table
+        query = db.session.query(*[table.c[name] for name in names])
+    else:
+        key, per_limit = per
+        ranked = select(
+            *[table.c[name] for name in names],
+            func.row_number().over(
+                partition_by=table.c[key],
+                order_by=table.c.id).label('rank')).where(
+            *criteria).subquery()
+        source, criteria = ranked, [ranked.c.rank <= per_limit]
+        query = db.session.query(*[ranked.c[name] for name in names])
+    query = query.filter(*criteria)
+    if after is not None:
+        query = query.filter(source.c.id > after)
+    query = query.order_by(source.c.id)
+    if limit is not None:
+        query = query.limit(limit)
+    rows = query.all()
+
+    genres = {}
+    if 'genres' in fields and rows:
+        owner = API_GENRE_OWNERS[kind]
+        genre_rows = db.session.query(owner, Genre.name).join(
+            Genre,
+            Genre.id == owner.table.c.genre_id).filter(
+            owner.in_([row.id for row in rows])).order_by(
+            Genre.name)
+        for owner_id, name in genre_rows:
+            genres.setdefault(owner_id, []).append(name)
+
+    records = [{
+        name: genres.get(row.id, []) if name == 'genres'
+        else api_value(getattr(row, name))
+        for name in fields} for row in rows]
+    return rows, records
+
+
+def api_records(kind, criteria, after=None, limit=None):
+    """Records of `kind` with the requested fields and includes."""
+    fields = api_fields(kind, primary=True)
+    includes = {name: API_INCLUDES[kind][name] for name in api_includes(kind)}
+    table = API_MODELS[kind].__table__
+    keys = [column.name for _, column in includes.values()
+            if column.table is table]
+    rows, records = api_load(kind, fields, criteria, keys, after, limit)
+
+    for name, (related, column) in includes.items():
+        if column.table is table:
+            # each record points at one related record
+            ids = {getattr(row, column.name) for row in rows}
+            _, found = api_load(related, api_fields(related), [
+                API_MODELS[related].id.in_(ids)]) if ids else (None, [])
+            by_id = {record['id']: record for record in found}
+            for row, record in zip(rows, records):
+                record[name] = by_id.get(getattr(row, column.name))
+        else:
+            # the related records point at ours; one more than shown tells
+            # whether there are others to link to
+            most = current_app.config['API_MAX_INCLUDED']
+            ids = [row.id for row in rows]
+            related_rows, found = api_load(
+                related, api_fields(related), [column.in_(ids)],
+                keys=[column.name], per=(column.name, most + 1)) \
+                if ids else ([], [])
+            grouped = {}
+            for row, record in zip(related_rows, found):
+                owner_id = getattr(row, column.name)
+                grouped.setdefault(owner_id, []).append(record)
+            for row, record in zip(rows, records):
+                included = grouped.get(row.id, [])
+                record[name] = included[:most]
+                if len(included) > most:
+                    record[name + '_next'] = url_for(
+                        '.api_list', kind=related,
+                        after=included[most - 1]['id'],
+                        **{column.name: row.id})
+    return records
+
+
+@api.route('/<any(venues, artists, shows):kind>')
+def api_list(kind):
+    per_page = min(
+        request.args.get('per_page', current_app.config['API_PER_PAGE'], type=int),
+        current_app.config['API_MAX_PER_PAGE'])
+    if per_page < 1:
+        abort(400, 'per_page must be positive')
+    table = API_MODELS[kind].__table__
+    criteria = []
+    for name in API_FILTERS[kind]:
+        value = request.args.get(name)
+        if value is not None:
+            if not value.isdigit():
+                abort(400, '{} must be an id'.format(name))
+            criteria.append(table.c[name] == int(value))
+    records = api_records(
+        kind, criteria, after=request.args.get('after', type=int),
+        limit=per_page + 1)
+
+    next_url = None
+    if len(records) > per_page:
+        records = records[:per_page]
+        args = dict(request.args.items(), after=records[-1]['id'])
+        next_url = url_for('.api_list', kind=kind, **args)
+    return jsonify({"data": records, "next": next_url})
+
+
+@api.route('/shows', methods=['POST'])
+def api_book_shows():
+    # one show as an object, or a tour as a list, optionally under "data"
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict) and 'data' in payload:
+        payload = payload['data']
+    bookings = payload if isinstance(payload, list) else [payload]
+    if len(bookings) > current_app.config['SHOWS_MAX_BATCH']:
+        abort(413, 'At most {} shows can be booked at once'.format(
+            current_app.config['SHOWS_MAX_BATCH']))
+    try:
+        booked = book_shows(bookings)
+    except BookingError as error:
+        return jsonify({"error": {
+            "status": 422,
+            "message": 'No shows were booked',
+            "details": [{"index": index, "message": message}
+                        for index, message in error.errors]}}), 422
+    return jsonify({"data": {"booked": booked}}), 201
+
+
+@api.route('/<any(venues, artists, shows):kind>/<int:entity_id>')
+def api_detail(kind, entity_id):
+    records = api_records(kind, [API_MODELS[kind].id == entity_id])
+    if not records:
+        abort(404, 'No {} with id {}'.format(kind[:-1], entity_id))
+    return jsonify({"data": records[0]})
+
+
+# the site's own 404 and 500 handlers render HTML, so these codes are
+# registered explicitly to win over them
+@api.errorhandler(404)
+@api.errorhandler(500)
+@api.errorhandler(HTTPException)
+def api_error(error):
+    return jsonify({"error": {"status": error.code,
+                              "message": error.description}}), error.code
 
 # ----------------------------------------------------------------------------#
 # Launch.
@@ -731,6 +2511,7 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
+    app = create_app()
     app.debug = True
     app.run(host='127.0.0.1', port=5000)
 
@@ -738,5 +2519,5 @@ if __name__ == '__main__':
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT',3000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
@@ -0,0 +1,82 @@
+"""Render 10k show tiles with the old and the current `datetime` filter.
+
+    python benchmarks/datetime_filter.py [--tiles N] [--repeat R]
+
+The old filter re-parsed a string with dateutil and handed Babel a pattern
+string to parse again on every call; the current one takes the datetime the
+controllers pass and reuses a compiled pattern per (format, locale).
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+
+
+TILE = '''{% for show in shows %}
+<div class="tile tile-show">
+  <img src="{{ show.artist_image_link }}" alt="Artist Image" />
+  <h4>{{ show.start_time|datetime('full') }}</h4>
+  <h5><a href="/artists/{{ show.artist_id }}">{{ show.artist_name }}</a></h5>
+  <p>playing at</p>
+  <h5><a href="/venues/{{ show.venue_id }}">{{ show.venue_name }}</a></h5>
+</div>
+{% endfor %}'''
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def make_shows(n):
+    start = datetime(2030, 1, 1, 20, 0)
+    return [{
+        "venue_id": i % 97,
+        "venue_name": "Venue {}".format(i % 97),
+        "artist_id": i % 113,
+        "artist_name": "Artist {}".format(i % 113),
+        "artist_image_link": "https://example.com/{}.jpg".format(i % 113),
+        "start_time": start + timedelta(hours=7 * i),
+    } for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tiles', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    shows = make_shows(args.tiles)
+    legacy_shows = [dict(show, start_time=str(show['start_time']))
+                    for show in shows]
+
+    legacy_env = app.jinja_env.overlay()
+    legacy_env.filters = dict(app.jinja_env.filters,
+                              datetime=legacy_format_datetime)
+    before = legacy_env.from_string(TILE)
+    after = app.jinja_env.from_string(TILE)
+    assert before.render(shows=legacy_shows) == after.render(shows=shows)
+
+    for label, template, data in (('before', before, legacy_shows),
+                                  ('after', after, shows)):
+        best = min(timeit.repeat(lambda: template.render(shows=data),
+                                 number=1, repeat=args.repeat))
+        print('{:<7}{:>9.1f} ms  ({} tiles, best of {})'.format(
+            label, best * 1000, args.tiles, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Measure how long a fresh worker takes to serve its first request.
+
+    python benchmarks/startup.py [--runs N] [--budget-ms MS]
+
+Each run starts a new interpreter that imports app.py, builds the app with
+create_app() and serves GET /, timing each step. The script exits with
+status 1 when the median total is over the budget, so CI can fail the build
+when cold start regresses. Set FYYUR_WEB_WORKER=1 and TEMPLATE_CACHE_DIR to
+measure a worker the way production starts it.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in a fresh interpreter, so nothing is imported or compiled yet.
+WORKER = '''
+import json, time, warnings
+warnings.simplefilter('ignore')
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+created = time.perf_counter()
+assert application.test_client().get('/').status_code == 200
+served = time.perf_counter()
+print(json.dumps({
+    'import': imported - started,
+    'create_app': created - imported,
+    'first_request': served - created,
+    'total': served - started,
+}))
+'''
+
+# Median milliseconds from import to the first response that CI accepts
+DEFAULT_BUDGET_MS = 1000
+
+
+def measure():
+    output = subprocess.run(
+        [sys.executable, '-c', WORKER], cwd=ROOT, check=True,
+        stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=float(
+        os.environ.get('STARTUP_BUDGET_MS', DEFAULT_BUDGET_MS)))
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.runs)]
+    for step in ('import', 'create_app', 'first_request', 'total'):
+        print('{:<14}{:>8.1f} ms'.format(
+            step, statistics.median(run[step] for run in runs) * 1000))
+
+    total_ms = statistics.median(run['total'] for run in runs) * 1000
+    if total_ms > args.budget_ms:
+        print('cold start {:.1f} ms is over the {:.0f} ms budget'.format(
+            total_ms, args.budget_ms))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Key/value caches for rendered page fragments.
+
+Both backends offer the same small interface: get/set for entries with an
+optional timeout, plus version()/bump() counters used to build keys, so that
+bumping an entity's version retires every fragment cached for it.
+
+LRUCache lives in the worker process. RedisCache talks to Redis (or anything
+that speaks its protocol, e.g. fakeredis) so all workers share entries and
+versions. Use a Redis eviction policy that only evicts keys with a timeout
+(volatile-lru), since version counters are stored without one.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # versions are never evicted: losing one would bring back fragments
+        # cached under an older number
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        expires = time.time() + timeout if timeout else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def version(self, name):
+        return self._versions.get(name, 0)
+
+    def bump(self, name):
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            return self._versions[name]
+
+
+class RedisCache:
+
+    def __init__(self, url=None, client=None, prefix='fyyur:'):
+        if client is None:
+            # optional dependency, only needed for this backend
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return value
+
+    def set(self, key, value, timeout=None):
+        self.client.set(self.prefix + key, str(value),
+                        ex=max(int(timeout), 1) if timeout else None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def version(self, name):
+        return int(self.client.get(self.prefix + 'version:' + name) or 0)
+
+    def bump(self, name):
+        return self.client.incr(self.prefix + 'version:' + name)
+
+
+def create_cache(config):
+    """The cache backend selected by CACHE_TYPE ('lru' or 'redis')."""
+    if config['CACHE_TYPE'] == 'redis':
+        return RedisCache(config['CACHE_REDIS_URL'])
+    if config['CACHE_TYPE'] == 'lru':
+        return LRUCache(config['CACHE_LRU_SIZE'])
+    raise ValueError('unknown CACHE_TYPE {!r}'.format(config['CACHE_TYPE']))
@@ -0,0 +1,35 @@
+"""trigram indexes for venue and artist name search
+
+Revision ID: 3c1f0b7d9a2e
+Revises: 55aa83d7923d
+Create Date: 2026-10-18 09:12:40.218351
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f0b7d9a2e'
+down_revision = '55aa83d7923d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # pg_trgm only exists on Postgres; other databases keep scanning.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_Venue_name_trgm', 'Venue', ['name'],
+                    postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_Artist_name_trgm', 'Artist', ['name'],
+                    postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_Artist_name_trgm', table_name='Artist')
+    op.drop_index('ix_Venue_name_trgm', table_name='Venue')
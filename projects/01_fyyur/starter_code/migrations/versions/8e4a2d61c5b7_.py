@@ -0,0 +1,100 @@
+"""normalize genres into Genre and association tables
+
+Revision ID: 8e4a2d61c5b7
+Revises: 3c1f0b7d9a2e
+Create Date: 2026-10-18 10:03:27.551904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4a2d61c5b7'
+down_revision = '3c1f0b7d9a2e'
+branch_labels = None
+depends_on = None
+
+
+def _split(genres):
+    names = (name.strip() for name in (genres or '').split(','))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def upgrade():
+    genre = op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    venue_genres = op.create_table('venue_genres',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('venue_id', 'genre_id')
+    )
+    op.create_index(op.f('ix_venue_genres_genre_id'), 'venue_genres', ['genre_id'], unique=False)
+    artist_genres = op.create_table('artist_genres',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('artist_id', 'genre_id')
+    )
+    op.create_index(op.f('ix_artist_genres_genre_id'), 'artist_genres', ['genre_id'], unique=False)
+
+    # move the comma-joined strings into the new tables
+    bind = op.get_bind()
+    venues = bind.execute(sa.text('SELECT id, genres FROM "Venue"')).fetchall()
+    artists = bind.execute(sa.text('SELECT id, genres FROM "Artist"')).fetchall()
+    names = {}
+    for _, genres in venues + artists:
+        for name in _split(genres):
+            names.setdefault(name, len(names) + 1)
+    if names:
+        op.bulk_insert(genre, [{'id': genre_id, 'name': name}
+                               for name, genre_id in names.items()])
+        if bind.dialect.name == 'postgresql':
+            op.execute("SELECT setval('\"Genre_id_seq\"', "
+                       "(SELECT max(id) FROM \"Genre\"))")
+    rows = [{'venue_id': venue_id, 'genre_id': names[name]}
+            for venue_id, genres in venues for name in _split(genres)]
+    if rows:
+        op.bulk_insert(venue_genres, rows)
+    rows = [{'artist_id': artist_id, 'genre_id': names[name]}
+            for artist_id, genres in artists for name in _split(genres)]
+    if rows:
+        op.bulk_insert(artist_genres, rows)
+
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.drop_column('genres')
+    with op.batch_alter_table('Artist') as batch_op:
+        batch_op.drop_column('genres')
+
+
+def downgrade():
+    with op.batch_alter_table('Artist') as batch_op:
+        batch_op.add_column(sa.Column('genres', sa.String(length=120), nullable=True))
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.add_column(sa.Column('genres', sa.String(length=120), nullable=True))
+
+    bind = op.get_bind()
+    for table, key, link in (('Venue', 'venue_id', 'venue_genres'),
+                             ('Artist', 'artist_id', 'artist_genres')):
+        joined = {}
+        for owner_id, name in bind.execute(sa.text(
+                'SELECT l.{0}, g.name FROM {1} l JOIN "Genre" g '
+                'ON g.id = l.genre_id ORDER BY g.name'.format(key, link))):
+            joined.setdefault(owner_id, []).append(name)
+        for owner_id, names in joined.items():
+            bind.execute(
+                sa.text('UPDATE "{}" SET genres = :genres WHERE id = :id'.format(table)),
+                {'genres': ','.join(names)[:120], 'id': owner_id})
+
+    op.drop_index(op.f('ix_artist_genres_genre_id'), table_name='artist_genres')
+    op.drop_table('artist_genres')
+    op.drop_index(op.f('ix_venue_genres_genre_id'), table_name='venue_genres')
+    op.drop_table('venue_genres')
+    op.drop_table('Genre')
@@ -0,0 +1,32 @@
+"""add updated_at to Venue, Artist and Show
+
+Revision ID: d5a8c3e1f094
+Revises: b27d90e4f318
+Create Date: 2026-10-18 13:26:51.904377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a8c3e1f094'
+down_revision = 'b27d90e4f318'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # added nullable, backfilled, then made NOT NULL, since SQLite can't add
+    # a column with a non-constant default
+    for table in ('Venue', 'Artist', 'Show'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+        op.execute('UPDATE "{}" SET updated_at = CURRENT_TIMESTAMP'.format(table))
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+
+
+def downgrade():
+    for table in ('Show', 'Artist', 'Venue'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
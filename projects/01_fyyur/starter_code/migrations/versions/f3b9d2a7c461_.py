@@ -0,0 +1,55 @@
+"""add duration and end_time to Show, exclude overlapping shows
+
+Revision ID: f3b9d2a7c461
+Revises: d5a8c3e1f094
+Create Date: 2026-10-18 17:42:08.519273
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b9d2a7c461'
+down_revision = 'd5a8c3e1f094'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('duration', sa.Integer(), server_default='120', nullable=False))
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(timezone=True), nullable=True))
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("UPDATE \"Show\" SET end_time = datetime(start_time, '+' || duration || ' minutes')")
+    else:
+        op.execute("UPDATE \"Show\" SET end_time = start_time + duration * interval '1 minute'")
+    if dialect != 'postgresql':
+        return
+
+    # Postgres refuses overlapping bookings itself; list the ones already
+    # there rather than failing on the constraint with no details.
+    overlapping = op.get_bind().execute(sa.text(
+        'SELECT a.id, b.id FROM "Show" a JOIN "Show" b ON a.id < b.id '
+        'AND (a.venue_id = b.venue_id OR a.artist_id = b.artist_id) '
+        'AND a.start_time < b.end_time AND b.start_time < a.end_time '
+        'LIMIT 20')).fetchall()
+    if overlapping:
+        raise RuntimeError(
+            'Overlapping shows must be moved or removed first: ' + ', '.join(
+                '{} and {}'.format(*pair) for pair in overlapping))
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for column in ('venue_id', 'artist_id'):
+        op.execute(
+            'ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_{0}_overlap" '
+            'EXCLUDE USING gist ({0} WITH =, tstzrange(start_time, end_time) WITH &&) '
+            'WHERE (start_time IS NOT NULL)'.format(column))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for column in ('artist_id', 'venue_id'):
+            op.execute('ALTER TABLE "Show" DROP CONSTRAINT "ex_Show_{}_overlap"'.format(column))
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_column('end_time')
+        batch_op.drop_column('duration')
@@ -0,0 +1,100 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as fyyur  # noqa: E402
+from cache import RedisCache  # noqa: E402
+
+
+TEST_CONFIG = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+    'TESTING': True,
+    'DEBUG': False,
+    'WTF_CSRF_ENABLED': False,
+    'SECRET_KEY': 'test',
+}
+
+
+@pytest.fixture
+def config():
+    """Settings for the app fixture; tests may add to them first."""
+    return dict(TEST_CONFIG)
+
+
+@pytest.fixture
+def app(config):
+    flask_app = fyyur.create_app(config)
+    with flask_app.app_context():
+        fyyur.db.create_all()
+        yield flask_app
+        fyyur.db.session.remove()
+        fyyur.db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def statements(app):
+    """SQL statements run on the primary database while the test runs."""
+    executed = []
+
+    def record(connection, cursor, statement, *args):
+        executed.append(statement)
+
+    event.listen(fyyur.db.engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(fyyur.db.engine, 'before_cursor_execute', record)
+
+
+@pytest.fixture
+def workers(tmp_path, config):
+    """Two apps on one SQLite file, sharing a fakeredis cache: two worker
+    processes of the same deployment, as far as the app can tell.
+
+    Use each one in its own app context or request, one at a time.
+    """
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    config = dict(config, SQLALCHEMY_DATABASE_URI='sqlite:///{}'.format(
+        tmp_path / 'fyyur.db'))
+    apps = []
+    for _ in range(2):
+        worker = fyyur.create_app(config)
+        worker.extensions['cache'] = RedisCache(
+            client=fakeredis.FakeRedis(server=server))
+        apps.append(worker)
+    with apps[0].app_context():
+        fyyur.db.create_all()
+    return apps
+
+
+@pytest.fixture
+def seed():
+    """seed(shows) adds a venue and an artist with `shows` shows between
+    them, half of them past, and returns (venue_id, artist_id). It uses the
+    app of the current app context."""
+    def seed(shows, name='The Musical Hop'):
+        venue = fyyur.Venue(
+            name=name, city='San Francisco', state='CA',
+            genres=fyyur.genres_from_names(['Jazz', 'Folk']))
+        artist = fyyur.Artist(
+            name='Guns N Petals', city='San Francisco', state='CA',
+            genres=fyyur.genres_from_names(['Rock n Roll']))
+        fyyur.db.session.add_all([venue, artist])
+        fyyur.db.session.flush()
+        now = datetime.now().replace(microsecond=0)
+        fyyur.db.session.add_all([
+            fyyur.Show(venue_id=venue.id, artist_id=artist.id,
+                       start_time=now + timedelta(days=i - shows // 2))
+            for i in range(shows)])
+        fyyur.db.session.commit()
+        return venue.id, artist.id
+    return seed
@@ -0,0 +1,86 @@
+"""The /api/v1 JSON API."""
+import re
+
+import pytest
+
+import app as fyyur
+
+
+@pytest.fixture
+def config(config):
+    config['API_MAX_INCLUDED'] = 3
+    return config
+
+
+def selected_columns(statement):
+    """Names of the columns the outermost SELECT of `statement` reads."""
+    columns = statement[:statement.index('FROM')]
+    return {name for name in re.findall(r'\.(\w+) AS', columns.replace(
+        '"', ''))}
+
+
+def test_only_requested_fields_are_selected(client, seed, statements):
+    seed(2)
+    statements.clear()
+    data = client.get('/api/v1/venues?fields=name').get_json()['data']
+    assert [set(venue) for venue in data] == [{'id', 'name'}]
+    assert len(statements) == 1
+    assert selected_columns(statements[0]) == {'id', 'name'}
+
+
+def test_only_requested_fields_of_included_shows_are_selected(
+        client, seed, statements):
+    seed(2)
+    statements.clear()
+    data = client.get('/api/v1/venues?fields=name&include=shows'
+                      '&fields[shows]=start_time').get_json()['data']
+    assert [set(venue) for venue in data] == [{'id', 'name', 'shows'}]
+    assert [set(show) for show in data[0]['shows']] == \
+        [{'id', 'start_time'}] * 2
+    venues, shows = statements
+    assert selected_columns(venues) == {'id', 'name'}
+    # venue_id is read to hand each show to its venue, but not sent
+    assert selected_columns(shows) == {'id', 'start_time', 'venue_id'}
+
+
+def test_included_shows_are_capped_per_record(client, seed, statements):
+    busy, _ = seed(7)
+    quiet, _ = seed(2, name='Park Square Live Music & Coffee')
+    statements.clear()
+    data = client.get('/api/v1/venues?include=shows').get_json()['data']
+    # the venues, their genres, then their shows
+    assert len(statements) == 3
+    venues = {venue['id']: venue for venue in data}
+    assert len(venues[busy]['shows']) == 3
+    assert len(venues[quiet]['shows']) == 2
+    assert 'shows_next' not in venues[quiet]
+    assert all(show['venue_id'] == busy for show in venues[busy]['shows'])
+
+
+def test_rest_of_the_shows_are_linked(client, seed):
+    venue_id, _ = seed(7)
+    venue = client.get('/api/v1/venues/{}?include=shows'.format(
+        venue_id)).get_json()['data']
+    shows = [show['id'] for show in venue['shows']]
+
+    url = venue['shows_next']
+    while url:
+        page = client.get(url).get_json()
+        shows += [show['id'] for show in page['data']]
+        url = page['next']
+    expected = [show.id for show in fyyur.Show.query.filter_by(
+        venue_id=venue_id).order_by(fyyur.Show.id)]
+    assert shows == expected
+
+
+def test_shows_list_filters(client, seed):
+    venue_id, artist_id = seed(2)
+    seed(3, name='Park Square Live Music & Coffee')
+    data = client.get('/api/v1/shows?venue_id={}'.format(
+        venue_id)).get_json()['data']
+    assert len(data) == 2
+    assert {show['venue_id'] for show in data} == {venue_id}
+    data = client.get('/api/v1/shows?artist_id={}'.format(
+        artist_id)).get_json()['data']
+    assert {show['artist_id'] for show in data} == {artist_id}
+    assert client.get('/api/v1/shows?venue_id=x').status_code == 400
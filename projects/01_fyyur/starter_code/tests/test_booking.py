@@ -0,0 +1,79 @@
+"""Booking shows through book_shows() and POST /api/v1/shows."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import exc
+
+import app as fyyur
+
+
+def booking(venue_id, artist_id, days, **values):
+    start = datetime.now().replace(microsecond=0) + timedelta(days=days)
+    return dict(venue_id=venue_id, artist_id=artist_id,
+                start_time=start.isoformat(), **values)
+
+
+def test_booking_is_one_transaction(app, seed, monkeypatch):
+    venue_id, artist_id = seed(0)
+    refresh = fyyur.refresh_upcoming_counts
+
+    def refresh_then_fail(venue_ids=None):
+        refresh(venue_ids)
+        raise exc.OperationalError('UPDATE', {}, Exception('lost'))
+
+    monkeypatch.setattr(fyyur, 'refresh_upcoming_counts', refresh_then_fail)
+    with pytest.raises(exc.OperationalError):
+        fyyur.book_shows([booking(venue_id, artist_id, 10),
+                          booking(venue_id, artist_id, 20)])
+    assert fyyur.Show.query.count() == 0
+    assert fyyur.db.session.get(fyyur.Venue, venue_id).num_upcoming_shows \
+        in (None, 0)
+
+
+def test_booked_shows_are_counted(app, seed):
+    venue_id, artist_id = seed(0)
+    assert fyyur.book_shows([booking(venue_id, artist_id, 10),
+                             booking(venue_id, artist_id, 20)]) == 2
+    fyyur.db.session.remove()
+    assert fyyur.db.session.get(fyyur.Venue, venue_id).num_upcoming_shows \
+        == 2
+
+
+def tour(venue_id, artist_id, shows, first_day=1):
+    return [booking(venue_id, artist_id, first_day + i) for i in range(shows)]
+
+
+def test_full_batch_can_be_booked(app, client, seed):
+    venue_id, artist_id = seed(0)
+    shows = tour(venue_id, artist_id, app.config['SHOWS_MAX_BATCH'])
+    response = client.post('/api/v1/shows', json=shows)
+    assert response.status_code == 201, response.get_json()
+    assert response.get_json() == {'data': {'booked': len(shows)}}
+
+    # the whole tour again: every show overlaps itself
+    response = client.post('/api/v1/shows', json=shows)
+    assert response.status_code == 422
+    details = response.get_json()['error']['details']
+    assert [detail['index'] for detail in details] == list(range(len(shows)))
+
+
+def test_conflict_late_in_a_batch_is_found(app, client, seed):
+    venue_id, artist_id = seed(0)
+    other_venue, _ = seed(0, name='Park Square Live Music & Coffee')
+    assert fyyur.book_shows([booking(other_venue, artist_id, 480)]) == 1
+    response = client.post('/api/v1/shows', json=tour(
+        venue_id, artist_id, app.config['SHOWS_MAX_BATCH']))
+    assert response.status_code == 422
+    assert [detail['index'] for detail in
+            response.get_json()['error']['details']] == [479]
+
+
+def test_import_default_batch_size(app, seed, tmp_path):
+    venue_id, artist_id = seed(0)
+    path = tmp_path / 'shows.csv'
+    path.write_text('venue_id,artist_id,start_time\n' + ''.join(
+        '{venue_id},{artist_id},{start_time}\n'.format(**show)
+        for show in tour(venue_id, artist_id, 1200)))
+    result = app.test_cli_runner().invoke(args=['import', 'shows', str(path)])
+    assert result.exit_code == 0, result.output
+    assert '1200 shows imported, 0 rows rejected' in result.output
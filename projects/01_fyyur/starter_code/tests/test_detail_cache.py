@@ -0,0 +1,116 @@
+"""Venue and artist page bodies are cached under the page's ETag in the
+shared cache, and no worker serves one after the page changed."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+import app as fyyur
+
+
+@pytest.fixture
+def pages(workers, seed):
+    a, _ = workers
+    with a.app_context():
+        return seed(4)
+
+
+def get(worker, path):
+    """(response, number of statements the request ran)"""
+    with worker.app_context():
+        engine = fyyur.db.engine
+    statements = []
+
+    def record(*args):
+        statements.append(args[2])
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = worker.test_client().get(path)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return response, len(statements)
+
+
+def test_body_is_shared_between_workers(workers, pages):
+    a, b = workers
+    venue_id, _ = pages
+    first, _ = get(a, '/venues/{}'.format(venue_id))
+    second, statements = get(b, '/venues/{}'.format(venue_id))
+    # only the validators were read
+    assert statements == 1
+    assert second.data == first.data
+    assert second.headers['ETag'] == first.headers['ETag']
+
+
+@pytest.mark.parametrize('path, edit, form, expected', [
+    ('/venues/{venue}', '/venues/{venue}/edit',
+     {'name': 'The Dueling Pianos Bar', 'genres': ['Jazz']},
+     b'The Dueling Pianos Bar'),
+    ('/venues/{venue}', '/venues/{venue}/edit',
+     {'name': 'The Musical Hop', 'genres': ['Classical']}, b'Classical'),
+    ('/venues/{venue}', '/artists/{artist}/edit',
+     {'name': 'The Wild Sax Band', 'genres': ['Jazz']}, b'The Wild Sax Band'),
+    ('/artists/{artist}', '/venues/{venue}/edit',
+     {'name': 'The Dueling Pianos Bar', 'genres': ['Jazz']},
+     b'The Dueling Pianos Bar'),
+])
+def test_edit_in_one_worker_is_seen_by_the_other(workers, pages, path, edit,
+                                                 form, expected):
+    a, b = workers
+    venue_id, artist_id = pages
+    path = path.format(venue=venue_id, artist=artist_id)
+    before, _ = get(a, path)
+    assert expected not in before.data
+
+    response = b.test_client().post(
+        edit.format(venue=venue_id, artist=artist_id), data=form)
+    assert response.status_code == 302
+
+    after, _ = get(a, path)
+    assert expected in after.data
+    assert after.headers['ETag'] != before.headers['ETag']
+    # and a client holding the old copy gets the new one, not a 304
+    response = a.test_client().get(path, headers={
+        'If-None-Match': before.headers['ETag']})
+    assert response.status_code == 200
+
+
+def test_booking_in_one_worker_is_seen_by_the_other(workers, pages):
+    a, b = workers
+    venue_id, artist_id = pages
+    before, _ = get(a, '/venues/{}'.format(venue_id))
+    with b.app_context():
+        fyyur.book_shows([{
+            'venue_id': venue_id, 'artist_id': artist_id,
+            'start_time': (datetime.now() + timedelta(days=30, hours=3))
+            .isoformat()}])
+    after, _ = get(a, '/venues/{}'.format(venue_id))
+    assert after.data.count(b'Guns N Petals') \
+        == before.data.count(b'Guns N Petals') + 1
+
+
+def test_per_process_caches_never_serve_old_pages(workers, pages):
+    # with CACHE_TYPE='lru' each worker has its own cache, and sees nothing
+    # of the other's writes but the database
+    a, b = workers
+    for worker in workers:
+        worker.extensions['cache'] = fyyur.create_cache(worker.config)
+    venue_id, _ = pages
+    get(a, '/venues/{}'.format(venue_id))
+    b.test_client().post('/venues/{}/edit'.format(venue_id), data={
+        'name': 'The Dueling Pianos Bar', 'genres': ['Jazz']})
+    after, _ = get(a, '/venues/{}'.format(venue_id))
+    assert b'The Dueling Pianos Bar' in after.data
+
+
+def test_warmed_pages_are_served_from_cache(workers, pages):
+    a, b = workers
+    with a.app_context():
+        assert fyyur.warm_caches(300) == 2
+    venue_id, artist_id = pages
+    for path in ('/venues/{}'.format(venue_id),
+                 '/artists/{}'.format(artist_id)):
+        _, statements = get(b, path)
+        assert statements == 1
@@ -0,0 +1,30 @@
+"""The venue and artist pages load in a fixed number of queries, however
+many shows they list."""
+import pytest
+
+import app as fyyur
+
+
+@pytest.mark.parametrize('load, owner', [
+    (fyyur.venue_page_data, 0),
+    (fyyur.artist_page_data, 1),
+])
+def test_query_count_does_not_grow_with_shows(seed, statements, load, owner):
+    counts = {}
+    for shows in (3, 30):
+        entity_id = seed(shows)[owner]
+        statements.clear()
+        data, _ = load(entity_id)
+        counts[shows] = len(statements)
+        assert data['past_shows_count'] + data['upcoming_shows_count'] \
+            == shows
+    # the page with its shows, then the genres
+    assert counts[3] == counts[30] == 2
+
+
+@pytest.mark.parametrize('path, owner', [('/venues/{}', 0),
+                                         ('/artists/{}', 1)])
+def test_detail_pages_render(client, seed, path, owner):
+    response = client.get(path.format(seed(5)[owner]))
+    assert response.status_code == 200
+    assert b'Guns N Petals' in response.data
@@ -0,0 +1,74 @@
+"""`flask import` reads its files a record at a time and reports bad
+records instead of failing."""
+import io
+import json
+
+import pytest
+
+import app as fyyur
+
+
+def venue(i):
+    return {'name': 'Venue {}'.format(i), 'city': 'San Francisco',
+            'state': 'CA', 'seeking_talent': i % 2 == 0}
+
+
+@pytest.fixture
+def import_file(tmp_path, app):
+    runner = app.test_cli_runner()
+
+    def import_file(name, text, kind='venues'):
+        path = tmp_path / name
+        path.write_text(text, encoding='utf-8')
+        return runner.invoke(args=['import', kind, str(path)])
+    return import_file
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1 << 16])
+def test_json_array_is_read_in_chunks(chunk_size):
+    records = [venue(i) for i in range(20)]
+    text = '[\n' + ',\n'.join(json.dumps(record) for record in records) \
+        + '\n]\n'
+    read = list(fyyur.read_json_array(io.StringIO(text), chunk_size))
+    assert read == [(line, record) for line, record in
+                    enumerate(records, 2)]
+
+
+@pytest.mark.parametrize('text, line, message', [
+    ('', 1, 'unexpected end of file'),
+    ('{"name": "x"}', 1, 'expected a JSON array'),
+    ('[{"name": "x"},\n {"name": }]', 2, 'Expecting value'),
+    ('[{"name": "x"} {"name": "y"}]', 1, "expected ',' or ']'"),
+    ('[{"name": "x"}', 1, 'unexpected end of file'),
+    ('[] []', 1, 'extra data after the array'),
+])
+def test_json_array_errors_say_where(text, line, message):
+    with pytest.raises(ValueError) as error:
+        list(fyyur.read_json_array(io.StringIO(text), 4))
+    assert error.value.line == line
+    assert message in str(error.value)
+
+
+def test_json_array_record_size_is_bounded(monkeypatch):
+    monkeypatch.setattr(fyyur, 'JSON_MAX_RECORD', 100)
+    text = '[{"name": "' + 'x' * 1000 + '"}]'
+    with pytest.raises(ValueError, match='record longer than 100 bytes'):
+        list(fyyur.read_json_array(io.StringIO(text), 16))
+
+
+def test_malformed_json_file_is_reported(import_file):
+    result = import_file('venues.json', '[{}, {}, \n{"name": "Venue 3",}]'
+                         .replace('{}', json.dumps(venue(1)), 1)
+                         .replace('{}', json.dumps(venue(2)), 1))
+    assert result.exit_code == 0, result.output
+    assert 'venues.json:2: invalid JSON, import stopped' in result.output
+    assert '2 venues imported, 1 rows rejected' in result.output
+    assert fyyur.Venue.query.count() == 2
+
+
+def test_malformed_json_lines_are_reported(import_file):
+    result = import_file('venues.jsonl', '\n'.join([
+        json.dumps(venue(1)), '{"name": ', json.dumps(venue(3))]))
+    assert result.exit_code == 0, result.output
+    assert 'venues.jsonl:2: invalid JSON' in result.output
+    assert '2 venues imported, 1 rows rejected' in result.output
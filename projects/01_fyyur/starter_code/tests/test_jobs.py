@@ -0,0 +1,103 @@
+"""Periodic jobs, and the advisory locks that elect one process per job."""
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+import app as fyyur
+
+
+def test_jobs_run_when_due(app, seed):
+    venue_id, _ = seed(4)
+    fyyur.Show.query.filter_by(venue_id=venue_id).update({
+        'start_time': datetime.now() - timedelta(seconds=30)})
+    fyyur.db.session.get(fyyur.Venue, venue_id).num_upcoming_shows = 4
+    fyyur.db.session.commit()
+
+    runner = fyyur.JobRunner(app, ['roll-shows', 'refresh-aggregates'])
+    wait = runner.run_pending()
+    assert runner.results == {'roll-shows': 1, 'refresh-aggregates': 1}
+    assert 0 < wait <= app.config['JOB_INTERVALS']['roll-shows']
+    fyyur.db.session.remove()
+    assert fyyur.db.session.get(fyyur.Venue, venue_id).num_upcoming_shows \
+        == 0
+
+    # nothing is due again yet
+    runner.results.clear()
+    runner.run_pending()
+    assert runner.results == {}
+
+
+POSTGRES_URL = os.environ.get('TEST_POSTGRES_URL')
+
+
+@pytest.mark.skipif(not POSTGRES_URL, reason='TEST_POSTGRES_URL is not set')
+def test_one_process_holds_each_job_lock(config):
+    config['SQLALCHEMY_DATABASE_URI'] = POSTGRES_URL
+    app = fyyur.create_app(config)
+    first, second = fyyur.JobRunner(app), fyyur.JobRunner(app)
+    try:
+        with app.app_context():
+            assert first.acquire('roll-shows')
+            assert first.acquire('roll-shows')
+            assert not second.acquire('roll-shows')
+            assert second.acquire('warm-caches')
+
+            # the lock connection is never left inside a transaction
+            pid = first.connection.execute(
+                text('SELECT pg_backend_pid()')).scalar()
+            state = fyyur.db.session.execute(text(
+                'SELECT state FROM pg_stat_activity WHERE pid = :pid'),
+                {'pid': pid}).scalar()
+            assert state == 'idle'
+
+            first.release()
+            assert second.acquire('roll-shows')
+    finally:
+        with app.app_context():
+            first.release()
+            second.release()
+
+
+def backend_gone(pid):
+    return fyyur.db.session.execute(text(
+        'SELECT count(*) FROM pg_stat_activity WHERE pid = :pid'),
+        {'pid': pid}).scalar() == 0
+
+
+@pytest.mark.skipif(not POSTGRES_URL, reason='TEST_POSTGRES_URL is not set')
+def test_job_locks_are_lost_with_the_connection(config):
+    config['SQLALCHEMY_DATABASE_URI'] = POSTGRES_URL
+    app = fyyur.create_app(config)
+    first, second = fyyur.JobRunner(app), fyyur.JobRunner(app)
+    try:
+        with app.app_context():
+            assert first.acquire('roll-shows')
+            pid = first.pid
+            fyyur.db.session.execute(
+                text('SELECT pg_terminate_backend(:pid)'), {'pid': pid})
+            for _ in range(50):
+                if backend_gone(pid):
+                    break
+                time.sleep(0.1)
+            assert second.acquire('roll-shows')
+
+            # the dead connection is noticed, and the new one does not get
+            # the lock the other runner now holds
+            assert not first.acquire('roll-shows')
+            assert first.held == set()
+            assert first.pid != pid
+
+            # nor does a connection that reconnected on its own pass for
+            # the one that took the locks
+            assert first.acquire('warm-caches')
+            first.connection.invalidate()
+            assert not first.acquire('roll-shows')
+            assert first.held == set()
+            assert second.acquire('roll-shows')
+    finally:
+        with app.app_context():
+            first.release()
+            second.release()
@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(code):
+    return subprocess.run([sys.executable, '-c', code], cwd=HERE,
+                          capture_output=True, text=True)
+
+
+def test_lazy_modules_are_bound_on_their_packages():
+    result = run(
+        'import app\n'
+        'import babel.dates, dateutil.parser\n'
+        'assert babel.dates is app.babel_dates\n'
+        'assert dateutil.parser is app.dateutil_parser\n'
+        'print(dateutil.parser.parse("2020-01-01").year)\n')
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == '2020'
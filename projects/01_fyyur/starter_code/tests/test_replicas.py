@@ -0,0 +1,87 @@
+"""Reads made while serving GET requests go to a replica; writes, and the
+reads of a client that has just written, go to the primary."""
+import time
+
+import pytest
+from sqlalchemy import event
+
+import app as fyyur
+
+
+@pytest.fixture
+def replicated(tmp_path, config):
+    """An app on a primary and two replica SQLite files, all with the same
+    venue, and a log of which of them ran each statement of a request."""
+    config.update(
+        SQLALCHEMY_DATABASE_URI='sqlite:///{}'.format(tmp_path / 'primary.db'),
+        SQLALCHEMY_REPLICA_URIS=[
+            'sqlite:///{}'.format(tmp_path / 'replica{}.db'.format(i))
+            for i in (1, 2)],
+        REPLICA_LAG_TOLERANCE=0.5)
+    app = fyyur.create_app(config)
+    log = []
+    with app.app_context():
+        engines = {'primary': fyyur.db.engine}
+        for i, replica in enumerate(app.extensions['replica_engines'], 1):
+            engines['replica{}'.format(i)] = replica
+        for name, engine in engines.items():
+            fyyur.db.metadata.create_all(engine)
+            with engine.begin() as connection:
+                connection.execute(fyyur.Venue.__table__.insert(), {
+                    'id': 1, 'name': 'The Musical Hop',
+                    'updated_at': fyyur.utc_now()})
+            event.listen(engine, 'before_cursor_execute',
+                         lambda *args, name=name: log.append(name))
+    app.extensions['test_log'] = log
+    return app
+
+
+def databases(client, method, path, **kwargs):
+    """(response, set of databases its statements ran on)"""
+    log = client.application.extensions['test_log']
+    del log[:]
+    response = getattr(client, method)(path, **kwargs)
+    return response, set(log)
+
+
+@pytest.fixture
+def client(replicated):
+    return replicated.test_client()
+
+
+def test_get_reads_from_one_replica(client):
+    seen = set()
+    for _ in range(20):
+        response, used = databases(client, 'get', '/api/v1/venues/1')
+        assert response.status_code == 200
+        assert len(used) == 1 and used <= {'replica1', 'replica2'}
+        seen |= used
+        # a page runs several queries (validators, then the page itself)
+        response, used = databases(client, 'get', '/venues/1')
+        assert response.status_code == 200
+        assert len(used) == 1 and 'primary' not in used
+        seen |= used
+    assert seen == {'replica1', 'replica2'}
+
+
+def test_write_pins_client_to_primary_until_lag_passes(replicated, client):
+    response, used = databases(client, 'post', '/venues/1/edit', data={
+        'name': 'The Musical Hop', 'genres': ['Jazz']})
+    assert response.status_code == 302
+    assert used == {'primary'}
+
+    # the redirect after the write must see it
+    response, used = databases(client, 'get', response.location)
+    assert response.status_code == 200
+    assert used == {'primary'}
+
+    time.sleep(replicated.config['REPLICA_LAG_TOLERANCE'])
+    _, used = databases(client, 'get', '/api/v1/venues/1')
+    assert used <= {'replica1', 'replica2'} and used
+
+
+def test_other_clients_keep_reading_replicas(replicated, client):
+    databases(client, 'post', '/venues/1/edit', data={
+        'name': 'The Musical Hop', 'genres': ['Jazz']})
+    _, used = databases(replicated.test_client(), 'get', '/api/v1/venues/1')
+    assert 'primary' not in used and used
@@ -0,0 +1,36 @@
+"""Venue and artist search pages."""
+import pytest
+
+import app as fyyur
+
+
+@pytest.fixture
+def venues(app, seed):
+    for name in ('The Musical Hop', 'Park Square Live Music & Coffee',
+                 'The Dueling Pianos Bar'):
+        seed(0, name=name)
+
+
+def test_results_are_counted(app, venues):
+    with app.test_request_context():
+        results = fyyur.search_page(fyyur.Venue, 'music', 1)
+    assert results['count'] == 2
+    assert [row.name for row in results['data']] == [
+        'The Musical Hop', 'Park Square Live Music & Coffee']
+    assert results['prev_page'] is None and results['next_page'] is None
+
+
+def test_page_past_the_last_still_counts(app, venues):
+    app.config['SEARCH_PER_PAGE'] = 1
+    with app.test_request_context():
+        results = fyyur.search_page(fyyur.Venue, 'music', 5)
+    assert results['data'] == []
+    assert results['count'] == 2
+    assert results['prev_page'] == 2
+    assert results['next_page'] is None
+
+
+def test_search_form_past_the_last_page(client, venues):
+    response = client.post('/venues/search',
+                           data={'search_term': 'hop', 'page': 2})
+    assert b'Number of search results for "hop": 1' in response.data
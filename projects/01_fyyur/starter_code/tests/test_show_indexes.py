@@ -0,0 +1,70 @@
+"""The detail pages and /shows find their shows through the Show indexes
+of migration b27d90e4f318, not by scanning the table."""
+import os
+
+import pytest
+from sqlalchemy import event, inspect, text
+
+import app as fyyur
+
+
+def query_plans(run):
+    """EXPLAIN QUERY PLAN of each SELECT that run() sends to the database,
+    one string per statement."""
+    engine = fyyur.db.engine
+    selects = []
+
+    def record(connection, cursor, statement, parameters, *args):
+        if statement.lstrip().upper().startswith('SELECT'):
+            selects.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        run()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    with engine.connect() as connection:
+        return [' | '.join(row[-1] for row in connection.exec_driver_sql(
+            'EXPLAIN QUERY PLAN ' + statement, parameters))
+            for statement, parameters in selects]
+
+
+@pytest.fixture
+def shows(app, seed):
+    ids = [seed(40, name='Venue {}'.format(i)) for i in range(10)]
+    fyyur.db.session.execute(text('ANALYZE'))
+    return ids
+
+
+def test_venue_page_uses_venue_index(shows):
+    plans = query_plans(lambda: fyyur.venue_page_data(shows[3][0]))
+    assert 'SEARCH Show USING INDEX ix_Show_venue_id_start_time' in plans[0]
+
+
+def test_artist_page_uses_artist_index(shows):
+    plans = query_plans(lambda: fyyur.artist_page_data(shows[3][1]))
+    assert 'SEARCH Show USING INDEX ix_Show_artist_id_start_time' \
+        in plans[0]
+
+
+@pytest.mark.parametrize('query', ['', '?after=2000-01-01T20:00:00_5'])
+def test_shows_pages_use_start_time_index(app, client, shows, query):
+    plans = query_plans(lambda: client.get('/shows' + query))
+    # read in index order: no scan of Show, and no sort
+    assert 'SEARCH Show USING INDEX ix_Show_start_time_id' in plans[0] \
+        or 'SCAN Show USING INDEX ix_Show_start_time_id' in plans[0]
+    assert 'TEMP B-TREE' not in plans[0]
+
+
+def test_migrations_create_the_indexes(tmp_path, config):
+    flask_migrate = pytest.importorskip('flask_migrate')
+    config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///{}'.format(
+        tmp_path / 'migrated.db')
+    app = fyyur.create_app(config)
+    with app.app_context():
+        flask_migrate.upgrade(directory=os.path.join(
+            os.path.dirname(fyyur.__file__), 'migrations'))
+        indexes = {index['name'] for index in
+                   inspect(fyyur.db.engine).get_indexes('Show')}
+    assert {'ix_Show_venue_id_start_time', 'ix_Show_artist_id_start_time',
+            'ix_Show_start_time_id'} <= indexes
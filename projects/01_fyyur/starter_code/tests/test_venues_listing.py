@@ -0,0 +1,75 @@
+"""The /venues listing is cached, and any write to a venue or show drops
+it in every worker."""
+import app as fyyur
+
+
+def rename_venue(worker, venue_id, name):
+    with worker.app_context():
+        fyyur.db.session.get(fyyur.Venue, venue_id).name = name
+        fyyur.db.session.commit()
+
+
+def test_listing_is_served_from_cache(client, seed, statements):
+    seed(2)
+    assert b'The Musical Hop' in client.get('/venues').data
+    statements.clear()
+    assert b'The Musical Hop' in client.get('/venues').data
+    assert statements == []
+
+
+def test_write_in_one_worker_drops_listing_in_all(workers, seed):
+    a, b = workers
+    with a.app_context():
+        venue_id, _ = seed(2)
+    assert b'The Musical Hop' in a.test_client().get('/venues').data
+
+    rename_venue(b, venue_id, 'The Dueling Pianos Bar')
+    listing = a.test_client().get('/venues').data
+    assert b'The Dueling Pianos Bar' in listing
+    assert b'The Musical Hop' not in listing
+
+
+def test_new_show_drops_listing(workers, seed):
+    a, b = workers
+    with a.app_context():
+        seed(1)
+    a.test_client().get('/venues')
+    with b.app_context():
+        seed(1, name='Park Square Live Music & Coffee')
+    assert b'Park Square Live Music' in a.test_client().get('/venues').data
+
+
+def test_unknown_genres_are_not_cached(app, client, seed):
+    seed(1)
+    cache = app.extensions['cache']
+    for i in range(50):
+        assert client.get('/venues?genre=made-up-{}'.format(i)).status_code \
+            == 200
+    assert not any(key.startswith('venues:v')
+                   for key in cache._entries)
+
+    assert b'The Musical Hop' in client.get('/venues?genre=Jazz').data
+    assert [key for key in cache._entries if key.startswith('venues:v')] \
+        == ['venues:v1:Jazz']
+
+
+def test_areas_keep_their_own_venues(app, statements):
+    fyyur.db.session.add_all([
+        fyyur.Venue(name=name, city=city, state=state,
+                    num_upcoming_shows=upcoming)
+        for name, city, state, upcoming in [
+            ('The Dueling Pianos Bar', 'New York', 'NY', 1),
+            ('The Musical Hop', 'San Francisco', 'CA', 2),
+            ('Park Square Live Music & Coffee', 'San Francisco', 'CA', 3),
+            ('The Bitter End', 'New York', 'NY', None),
+        ]])
+    fyyur.db.session.commit()
+    statements.clear()
+    areas = fyyur.venue_areas()
+    assert len(statements) == 1
+    assert [(area['city'], area['num_upcoming_shows'],
+             [venue['name'] for venue in area['venues']])
+            for area in areas] == [
+        ('San Francisco', 5,
+         ['Park Square Live Music & Coffee', 'The Musical Hop']),
+        ('New York', 1, ['The Bitter End', 'The Dueling Pianos Bar'])]